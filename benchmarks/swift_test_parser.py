@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Replays `swift test` logs through SwiftTestParser and reports its throughput.
+#
+#   python3 benchmarks/swift_test_parser.py [log ...]
+#
+# Without arguments a synthetic log mixing XCTest and swift-testing output is generated.
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from front.SwiftTestParser import SwiftTestParser, SwiftTestHandler
+
+class CountingHandler(SwiftTestHandler):
+    events: int
+
+    def __init__(self) -> None:
+        self.events = 0
+
+    def building(self) -> None:
+        self.events += 1
+
+    def build_complete(self) -> None:
+        self.events += 1
+
+    def suite_started(self, name: str) -> None:
+        self.events += 1
+
+    def suite_finished(self, name: str, passed: bool, test_count: int | None, failed_count: int | None) -> None:
+        self.events += 1
+
+    def run_finished(self, test_count: int, failed_count: int) -> None:
+        self.events += 1
+
+def synthetic_log(target_size: int = 8 * 1024 * 1024) -> bytes:
+    lines: list[str] = []
+    for i in range(200):
+        lines.append(f"\x1b[1A\x1b[2K[{i}/200] Compiling Module{i} File{i}.swift\r[{i}/200] Emitting module Module{i}")
+    lines.append("Building for debugging...")
+    lines.append("Build complete! (12.34s)")
+    lines.append("Test Suite 'All tests' started at 2024-01-01 00:00:00.000.")
+    lines.append("Test Suite 'PackageTests.xctest' started at 2024-01-01 00:00:00.000.")
+
+    size = sum(len(line) + 1 for line in lines)
+    suite = 0
+    while size < target_size:
+        block = [f"Test Suite 'Suite{suite}Tests' started at 2024-01-01 00:00:00.000."]
+        for case in range(20):
+            block.append(f"Test Case '-[PackageTests.Suite{suite}Tests testCase{case}]' started.")
+            block.append(f"/path/to/Sources/Suite{suite}.swift:{case}: debug output of the test case {case}")
+            block.append(f"Test Case '-[PackageTests.Suite{suite}Tests testCase{case}]' passed (0.001 seconds).")
+        block.append(f"Test Suite 'Suite{suite}Tests' passed at 2024-01-01 00:00:01.000.")
+        block.append("\t Executed 20 tests, with 0 failures (0 unexpected) in 0.020 (0.021) seconds")
+        block.append(f"◇ Suite \"Testing Suite{suite}\" started.")
+        for case in range(20):
+            block.append(f"◇ Test testCase{case}() started.")
+            block.append(f"✔ Test testCase{case}() passed after 0.001 seconds.")
+        block.append(f"✔ Suite \"Testing Suite{suite}\" passed after 0.021 seconds.")
+        lines += block
+        size += sum(len(line.encode()) + 1 for line in block)
+        suite += 1
+
+    lines.append(f"✔ Test run with {suite * 20} tests passed after 12.000 seconds.")
+    return ("\n".join(lines) + "\n").encode()
+
+def replay(data: bytes, chunk_size: int) -> tuple[float, int]:
+    handler = CountingHandler()
+    parser = SwiftTestParser(handler)
+    start = time.perf_counter()
+    for offset in range(0, len(data), chunk_size):
+        parser.feed(data[offset:offset + chunk_size])
+    parser.close()
+    return time.perf_counter() - start, handler.events
+
+def main():
+    if len(sys.argv) > 1:
+        logs = [(path, Path(path).read_bytes()) for path in sys.argv[1:]]
+    else:
+        logs = [("synthetic", synthetic_log())]
+
+    for name, data in logs:
+        line_count = data.count(b"\n")
+        for chunk_size in (4096, 65536):
+            elapsed = min(replay(data, chunk_size)[0] for _ in range(3))
+            _, events = replay(data, chunk_size)
+            print(
+                f"{name}: {len(data) / 1024 / 1024:.1f} MB, chunk {chunk_size}: "
+                f"{len(data) / 1024 / 1024 / elapsed:.1f} MB/s, {line_count / elapsed:,.0f} lines/s, {events} events"
+            )
+
+if __name__ == "__main__":
+    main()
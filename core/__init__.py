@@ -4,4 +4,14 @@ from .logger import *
 from .command_result import CommandResult
 from .parallax_executor import *
 from .multiline_printer import *
-from .remove_escape_sequences import remove_escape_sequences
\ No newline at end of file
+from .remove_escape_sequences import remove_escape_sequences
+from .async_process_engine import AsyncProcessEngine
+from .task_driver import TaskDriver, spinner_frames
+from .tree_fingerprint import TreeFingerprint
+from .dependency_graph import DependencyGraph
+from .duration_store import DurationStore
+from .arguments import duration_argument
+from .adaptive_concurrency import AdaptiveConcurrency, parallel_argument
+from .memory_admission import MemoryAdmission, MemoryPeakStore
+from .disk_usage import disk_usage, format_bytes, size_argument, DiskUsageScanner
+from .tree_watcher import TreeWatcher
@@ -0,0 +1,97 @@
+from argparse import ArgumentTypeError
+from typing import Literal
+import os
+import threading
+
+from .parallax_executor import ParallaxExecutor
+
+TaskClass = Literal["network", "io", "cpu"]
+
+def parallel_argument(value: str) -> int | str:
+    """
+    argparse type of -p/--parallel: a positive number or "auto".
+    """
+    if value == "auto":
+        return value
+    try:
+        count = int(value)
+    except ValueError:
+        raise ArgumentTypeError(f"expected a number or 'auto', got '{value}'")
+    if count < 1:
+        raise ArgumentTypeError("must be at least 1")
+    return count
+
+class AdaptiveConcurrency:
+    """
+    Sizes an executor for the kind of work it runs. In auto mode a monitor thread shrinks the pool while
+    the load average is above the number of cores and grows it back up to the initial size once the load drops.
+    """
+    executor: ParallaxExecutor
+    task_class: TaskClass
+    interval: float
+    initial_parallel: int
+
+    _stopped: threading.Event
+    _monitor: threading.Thread | None
+
+    def __init__(self, executor: ParallaxExecutor, task_class: TaskClass, interval: float = 2.0) -> None:
+        self.executor = executor
+        self.task_class = task_class
+        self.interval = interval
+        self.initial_parallel = self.auto_parallel(task_class)
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    @classmethod
+    def apply(cls, executor: ParallaxExecutor, parallel: int | str, task_class: TaskClass) -> "AdaptiveConcurrency":
+        """
+        Set the size of the executor from a -p value. Call stop() on the result when the work is done.
+        """
+        concurrency = cls(executor, task_class)
+        if parallel == "auto":
+            executor.max_parallel = concurrency.initial_parallel
+            concurrency.start()
+        else:
+            executor.max_parallel = int(parallel)
+        return concurrency
+
+    @staticmethod
+    def auto_parallel(task_class: TaskClass) -> int:
+        cpu_count = os.cpu_count() or 1
+        if task_class == "network":
+            # git spends its time waiting for the server
+            return min(64, cpu_count * 4)
+        if task_class == "io":
+            return cpu_count
+        # swift build and swift test already use several cores each
+        return max(1, min(cpu_count, cpu_count - round(AdaptiveConcurrency.load_average())))
+
+    @staticmethod
+    def load_average() -> float:
+        try:
+            return os.getloadavg()[0]
+        except (OSError, AttributeError):
+            return 0
+
+    def start(self):
+        if self._monitor is not None:
+            return
+        self._monitor = threading.Thread(target=self._monitor_loop)
+        self._monitor.daemon = True
+        self._monitor.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+
+    def _monitor_loop(self):
+        target_load = os.cpu_count() or 1
+        while not self._stopped.wait(self.interval):
+            load = self.load_average()
+            current = self.executor.max_parallel
+            if load > target_load and current > 1:
+                self.executor.max_parallel = current - 1
+            elif load < target_load * 0.75 and current < self.initial_parallel:
+                self.executor.max_parallel = current + 1
@@ -0,0 +1,19 @@
+from argparse import ArgumentTypeError
+
+def duration_argument(value: str) -> float:
+    """
+    argparse type of a duration such as 90s, 30m, 12h or 7d. A plain number is seconds.
+    """
+    units = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+    text = value.strip().lower()
+    multiplier = 1
+    if len(text) > 0 and text[-1] in units:
+        multiplier = units[text[-1]]
+        text = text[:-1]
+    try:
+        duration = float(text)
+    except ValueError:
+        raise ArgumentTypeError(f"expected a duration such as 30m or 12h, got '{value}'")
+    if duration < 0:
+        raise ArgumentTypeError("must not be negative")
+    return duration * multiplier
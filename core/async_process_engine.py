@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import asyncio
+import subprocess
+
+class AsyncProcessEngine:
+    """
+    Runs subprocesses on an asyncio event loop. A semaphore bounds how many are in flight at once.
+    """
+    max_concurrency: int
+    _semaphore: asyncio.Semaphore | None
+
+    def __init__(self, max_concurrency: int = 64) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = None
+
+    async def run(self, command: list[str], cwd: Path) -> subprocess.CompletedProcess[str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=cwd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+
+        return subprocess.CompletedProcess(
+            args=command,
+            returncode=process.returncode or 0,
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace")
+        )
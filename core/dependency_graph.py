@@ -0,0 +1,73 @@
+from typing import Callable, Generic, Hashable, Iterable, TypeVar
+
+Node = TypeVar("Node", bound=Hashable)
+
+class DependencyGraph(Generic[Node]):
+    """
+    A DAG of nodes and the nodes they depend on. Dependencies outside the node set are ignored,
+    and an edge that would close a cycle is dropped so the graph can always be scheduled.
+    """
+    nodes: list[Node]
+
+    _dependencies: dict[Node, list[Node]]
+    _dependents: dict[Node, list[Node]]
+
+    def __init__(self, nodes: Iterable[Node], dependencies: Callable[[Node], Iterable[Node]]) -> None:
+        self.nodes = list(nodes)
+        node_set = set(self.nodes)
+        declared = {node: [d for d in dependencies(node) if d in node_set and d != node] for node in self.nodes}
+
+        self._dependencies = {node: [] for node in self.nodes}
+        self._dependents = {node: [] for node in self.nodes}
+
+        # iterative DFS; an edge to a node still on the stack is a back edge
+        state: dict[Node, int] = {}
+        for start in self.nodes:
+            if start in state:
+                continue
+            state[start] = 1
+            stack = [(start, iter(declared[start]))]
+            while len(stack) > 0:
+                node, iterator = stack[-1]
+                dependency = next(iterator, None)
+                if dependency is None:
+                    state[node] = 2
+                    stack.pop()
+                    continue
+                if state.get(dependency) == 1:
+                    continue
+                self._dependencies[node].append(dependency)
+                self._dependents[dependency].append(node)
+                if dependency not in state:
+                    state[dependency] = 1
+                    stack.append((dependency, iter(declared[dependency])))
+
+    def dependencies(self, node: Node) -> list[Node]:
+        return self._dependencies[node]
+
+    def dependents(self, node: Node) -> list[Node]:
+        return self._dependents[node]
+
+    def critical_paths(self, weight: Callable[[Node], float] = lambda _: 1) -> dict[Node, float]:
+        """
+        For each node, the total weight of the longest chain that starts at it and runs through its dependents.
+        """
+        lengths: dict[Node, float] = {}
+        for node in reversed(self.topological_order()):
+            lengths[node] = weight(node) + max((lengths[d] for d in self._dependents[node]), default=0)
+        return lengths
+
+    def topological_order(self) -> list[Node]:
+        """
+        Dependencies before dependents; otherwise in the order the nodes were given.
+        """
+        remaining = {node: len(self._dependencies[node]) for node in self.nodes}
+        order = [node for node in self.nodes if remaining[node] == 0]
+        index = 0
+        while index < len(order):
+            for dependent in self._dependents[order[index]]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    order.append(dependent)
+            index += 1
+        return order
@@ -0,0 +1,176 @@
+from argparse import ArgumentTypeError
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
+def disk_usage(path: Path, seen_inodes: set[tuple[int, int]] | None = None) -> int:
+    """
+    Bytes allocated on disk by a directory tree. Files with several hard links are counted once per seen_inodes.
+    """
+    seen_inodes = seen_inodes if seen_inodes is not None else set()
+    total = 0
+    stack = [str(path)]
+    while len(stack) > 0:
+        try:
+            with os.scandir(stack.pop()) as iterator:
+                for entry in iterator:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif stat.st_nlink > 1:
+                            inode = (stat.st_dev, stat.st_ino)
+                            if inode in seen_inodes:
+                                continue
+                            seen_inodes.add(inode)
+                        total += allocated_size(stat)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+def allocated_size(stat: os.stat_result) -> int:
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+def size_argument(value: str) -> int:
+    """
+    argparse type of a size such as 500M, 20G or 1.5T. A plain number is bytes.
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = value.strip().upper().removesuffix("B").removesuffix("I")
+    multiplier = 1
+    if len(text) > 0 and text[-1] in units:
+        multiplier = units[text[-1]]
+        text = text[:-1]
+    try:
+        size = float(text)
+    except ValueError:
+        raise ArgumentTypeError(f"expected a size such as 500M or 20G, got '{value}'")
+    if size < 0:
+        raise ArgumentTypeError("must not be negative")
+    return int(size * multiplier)
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+@dataclass
+class DirectoryUsage:
+    mtime_ns: int
+    size: int
+    links: list[list[int]]
+    children: list[str]
+
+class DiskUsageScanner:
+    """
+    Parallel disk usage of several directory trees, with files with several hard links counted once across all of them.
+    The usage of a directory's own entries is cached by its mtime, so a repeated scan only lists directories that changed.
+    Growing a file in place doesn't change the mtime of its directory; pass use_cache=False for an exact scan.
+    """
+    cache_version = 1
+
+    cache_path: Path | None
+    max_workers: int
+    use_cache: bool
+
+    _cache: dict[str, DirectoryUsage]
+
+    def __init__(self, cache_path: Path | None = None, max_workers: int = 8, use_cache: bool = True) -> None:
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.use_cache = use_cache
+        self._cache = self._load() if use_cache else {}
+
+    def scan(self, roots: list[Path]) -> list[int]:
+        """
+        Allocated bytes of each tree. A file linked from several trees counts for the first one.
+        """
+        sizes = [0] * len(roots)
+        links: list[list[list[int]]] = [[] for _ in roots]
+        visited: dict[str, DirectoryUsage] = {}
+
+        frontier = [(index, str(root.absolute())) for index, root in enumerate(roots)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(frontier) > 0:
+                usages = executor.map(lambda item: self._scan_directory(item[1], self._cache.get(item[1])), frontier)
+                next_frontier: list[tuple[int, str]] = []
+                for (index, path), usage in zip(frontier, usages):
+                    if usage is None:
+                        continue
+                    visited[path] = usage
+                    sizes[index] += usage.size
+                    links[index].extend(usage.links)
+                    next_frontier.extend((index, os.path.join(path, child)) for child in usage.children)
+                frontier = next_frontier
+
+        seen_inodes: set[tuple[int, int]] = set()
+        for index in range(len(roots)):
+            for dev, ino, size in links[index]:
+                if (dev, ino) not in seen_inodes:
+                    seen_inodes.add((dev, ino))
+                    sizes[index] += size
+
+        # forget directories of the scanned trees that no longer exist
+        root_paths = {str(root.absolute()) for root in roots}
+        prefixes = tuple(root_path + os.sep for root_path in root_paths)
+        self._cache = {path: usage for path, usage in self._cache.items() if path not in root_paths and not path.startswith(prefixes)}
+        self._cache.update(visited)
+        return sizes
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        data = {"version": self.cache_version, "directories": {path: asdict(usage) for path, usage in self._cache.items()}}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def _scan_directory(self, path: str, cached: DirectoryUsage | None) -> DirectoryUsage | None:
+        try:
+            mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+        except OSError:
+            return None
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        usage = DirectoryUsage(mtime_ns=mtime_ns, size=0, links=[], children=[])
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        if entry.is_dir(follow_symlinks=False):
+                            usage.children.append(entry.name)
+                        elif stat.st_nlink > 1:
+                            usage.links.append([stat.st_dev, stat.st_ino, allocated_size(stat)])
+                            continue
+                        usage.size += allocated_size(stat)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return usage
+
+    def _load(self) -> dict[str, DirectoryUsage]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != self.cache_version:
+                return {}
+            return {path: DirectoryUsage(**usage) for path, usage in data["directories"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
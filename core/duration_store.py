@@ -0,0 +1,84 @@
+from pathlib import Path
+import json
+import os
+import statistics
+import threading
+
+from .filemanager import FileManager
+
+class DurationStore:
+    """
+    How long each package took for one subcommand, smoothed over past runs.
+    Packages without history are expected to take the median of the others.
+    """
+    store_version = 1
+    smoothing = 0.3
+    filename = "durations.json"
+
+    path: Path | None
+    command: str
+
+    _durations: dict[str, float]
+    _recorded: dict[str, float]
+    _lock: threading.Lock
+
+    def __init__(self, path: Path | None, command: str) -> None:
+        self.path = path
+        self.command = command
+        self._durations = self._load().get(command, {})
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of_command(cls, file_manager: FileManager | None, command: str) -> "DurationStore | None":
+        if file_manager is None:
+            return None
+        return cls(file_manager.command_directory() / cls.filename, command)
+
+    def expected(self, key: str) -> float:
+        with self._lock:
+            if key in self._durations:
+                return self._durations[key]
+            if len(self._durations) == 0:
+                return 0
+            return statistics.median(self._durations.values())
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            previous = self._durations.get(key)
+            duration = self._smoothed(previous, seconds)
+            self._durations[key] = duration
+            self._recorded[key] = duration
+
+    def _smoothed(self, previous: float | None, value: float) -> float:
+        return value if previous is None else previous + (value - previous) * self.smoothing
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            if len(self._recorded) == 0:
+                return
+            # other subcommands may have saved in the meantime; only this command's records are merged in
+            data = self._load()
+            data.setdefault(self.command, {}).update(self._recorded)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump({"version": self.store_version, "commands": data}, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+    def _load(self) -> dict[str, dict[str, float]]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != self.store_version:
+                return {}
+            return {command: {key: float(value) for key, value in durations.items()} for command, durations in data["commands"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
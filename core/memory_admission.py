@@ -0,0 +1,165 @@
+from typing import Any, Callable
+import os
+import threading
+
+from .duration_store import DurationStore
+
+class MemoryPeakStore(DurationStore):
+    """
+    Peak resident memory in bytes of each package's processes. A higher peak replaces the old one at once, a lower one is smoothed in.
+    """
+    filename = "memory_peaks.json"
+
+    def _smoothed(self, previous: float | None, value: float) -> float:
+        if previous is None or value > previous:
+            return value
+        return previous + (value - previous) * self.smoothing
+
+class MemoryAdmission:
+    """
+    Admission control of a ParallaxExecutor: a task is held back while starting it would leave less than
+    `headroom` bytes of MemAvailable. Running tasks are accounted with their recorded peak until their
+    processes actually use that much. A task is always admitted when nothing else is running.
+    Reads /proc, so it only has an effect on Linux.
+    """
+    headroom: int
+    peaks: MemoryPeakStore | None
+    peak_key: Callable[[Any], str] | None
+    interval: float
+
+    _condition: threading.Condition
+    _running: dict[int, int]
+    _tracked: dict[int, tuple[str | None, int]]
+    _sampler: threading.Thread | None
+
+    def __init__(self, headroom: int = 1024 * 1024 * 1024, peaks: MemoryPeakStore | None = None, peak_key: Callable[[Any], str] | None = None, interval: float = 0.5) -> None:
+        self.headroom = headroom
+        self.peaks = peaks
+        self.peak_key = peak_key
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._running = {}
+        self._tracked = {}
+        self._sampler = None
+
+    @staticmethod
+    def is_supported() -> bool:
+        return os.path.exists("/proc/meminfo")
+
+    def expected_peak(self, arg: Any) -> int:
+        if self.peaks is None or self.peak_key is None:
+            return 0
+        return int(self.peaks.expected(self.peak_key(arg)))
+
+    def acquire(self, arg: Any):
+        peak = self.expected_peak(arg)
+        with self._condition:
+            while len(self._running) > 0 and not self._fits(peak):
+                self._condition.wait(self.interval)
+            self._running[id(arg)] = peak
+
+    def release(self, arg: Any):
+        with self._condition:
+            self._running.pop(id(arg), None)
+            self._condition.notify_all()
+
+    def track(self, pid: int, arg: Any):
+        """
+        Sample the resident memory of the process tree of pid until untrack(), keeping its peak for the task.
+        """
+        if not self.is_supported():
+            return
+        key = self.peak_key(arg) if self.peak_key is not None else None
+        with self._condition:
+            self._tracked[pid] = (key, 0)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop)
+                self._sampler.daemon = True
+                self._sampler.start()
+
+    def untrack(self, pid: int) -> int:
+        with self._condition:
+            key, peak = self._tracked.pop(pid, (None, 0))
+        if key is not None and self.peaks is not None and peak > 0:
+            self.peaks.record(key, peak)
+        return peak
+
+    def save(self):
+        if self.peaks is not None:
+            self.peaks.save()
+
+    def _fits(self, peak: int) -> bool:
+        available = self.available_memory()
+        if available is None:
+            return True
+        # admitted tasks whose processes haven't grown to their recorded peak yet will still take that memory
+        outstanding = max(0, sum(self._running.values()) - self.children_rss())
+        return available - outstanding - peak >= self.headroom
+
+    def _sample_loop(self):
+        while True:
+            with self._condition:
+                if len(self._tracked) == 0:
+                    self._sampler = None
+                    return
+                pids = list(self._tracked.keys())
+            processes = self._read_processes()
+            with self._condition:
+                for pid in pids:
+                    if pid in self._tracked:
+                        key, peak = self._tracked[pid]
+                        self._tracked[pid] = (key, max(peak, self._tree_rss(pid, processes)))
+                self._condition.wait(self.interval)
+
+    @staticmethod
+    def available_memory() -> int | None:
+        try:
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    @classmethod
+    def children_rss(cls) -> int:
+        return cls._tree_rss(os.getpid(), cls._read_processes(), include_root=False)
+
+    @staticmethod
+    def _read_processes() -> dict[int, tuple[int, int]]:
+        """
+        pid -> (parent pid, resident bytes) of every process.
+        """
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        processes: dict[int, tuple[int, int]] = {}
+        try:
+            names = os.listdir("/proc")
+        except OSError:
+            return processes
+        for name in names:
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat", "r") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # the command name may contain spaces and parentheses; the fields after the last ")" are fixed
+            fields = stat[stat.rfind(")") + 2:].split()
+            if len(fields) > 21:
+                processes[int(name)] = (int(fields[1]), int(fields[21]) * page_size)
+        return processes
+
+    @staticmethod
+    def _tree_rss(root: int, processes: dict[int, tuple[int, int]], include_root: bool = True) -> int:
+        children: dict[int, list[int]] = {}
+        for pid, (ppid, _) in processes.items():
+            children.setdefault(ppid, []).append(pid)
+        total = processes[root][1] if include_root and root in processes else 0
+        stack = list(children.get(root, []))
+        while len(stack) > 0:
+            pid = stack.pop()
+            total += processes[pid][1]
+            stack.extend(children.get(pid, []))
+        return total
@@ -1,16 +1,19 @@
 import tty
 import re
-from typing import IO
+from typing import IO, Literal
+from collections import deque
 import sys
 import shutil
 import threading
-import queue
 
 import core
 
+LineStatus = Literal["waiting", "running", "success", "fail", "ignorable"]
+
 class SingleLinePrinter:
     _index: int | None # none if not root
     _message: str = ''
+    _status: LineStatus = "waiting"
     _subprinters: list["SingleLinePrinter"] 
     _indent_str: str = ""
     _base_printer: "MultilinePrinter | None"
@@ -27,9 +30,11 @@ class SingleLinePrinter:
         self._index = index
         self._parent = parent
 
-    def print(self, message: str):
+    def print(self, message: str, status: LineStatus | None = None):
         self._message = message
         root = self._get_root()
+        if status is not None:
+            root._status = status
         if root._base_printer is not None:
             root._base_printer._add_print_request(root)
         else:
@@ -66,28 +71,64 @@ class MultilinePrinter:
     command_name: str | None = None
 
     enabled = True
+
+    max_fps: float
+
+    # None: switch to the viewport automatically when the lines don't fit in the terminal
+    viewport: bool | None
+
+    terminal_height: int
     
     _all_messages: list[str]
-    
-    _already_printed: bool = False
 
     _print_thread: threading.Thread
 
-    _print_queue: queue.Queue[tuple[str, int]]
+    _pending: dict[int, tuple[str, LineStatus]]
+
+    _statuses: list[LineStatus]
+
+    _status_counts: dict[LineStatus, int]
+
+    # bookkeeping for the viewport, updated incrementally so a frame costs O(terminal height)
+    _running: dict[int, None]
+
+    _failures: dict[int, None]
 
-    _finished: bool = False
+    _recent: deque[int]
 
-    _line_flashed = 0
+    _lock: threading.Lock
+
+    _dirty: threading.Event
+
+    _terminated: threading.Event
+
+    # physical screen state of the last frame: one entry per '\n' separated line
+    _rendered_lines: list[str]
+
+    _rendered_rows: list[int]
 
     _printers: list[SingleLinePrinter] 
 
-    def __init__(self, nlines: int, out: IO[str] = sys.stdout, disable_input: bool = True, command_name: str | None = None) -> None:
+    def __init__(self, nlines: int, out: IO[str] = sys.stdout, disable_input: bool = True, command_name: str | None = None, max_fps: float = 20, viewport: bool | None = None) -> None:
         self.nlines = nlines
         self.command_name = command_name
-        self._print_queue = queue.Queue()
+        self.max_fps = max_fps
         self.out = out
         self.terminal_width = self._get_width()
+        self.terminal_height = self._get_height()
+        self.viewport = viewport
         self._all_messages = [''] * nlines
+        self._pending = {}
+        self._statuses = ["waiting"] * nlines
+        self._status_counts = {"waiting": nlines, "running": 0, "success": 0, "fail": 0, "ignorable": 0}
+        self._running = {}
+        self._failures = {}
+        self._recent = deque(maxlen=max(1, self.terminal_height))
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._terminated = threading.Event()
+        self._rendered_lines = []
+        self._rendered_rows = []
         self._printers = [SingleLinePrinter.make_root(i, self) for i in range(nlines)]
         if disable_input:
             try:
@@ -95,7 +136,7 @@ class MultilinePrinter:
             except:
                 # 無効化できない場合は無視
                 pass
-        self._print_thread = threading.Thread(target=self._loop_over_queue)
+        self._print_thread = threading.Thread(target=self._render_loop)
         self._print_thread.start()
 
     def printer(self, line: int) -> "SingleLinePrinter":
@@ -108,81 +149,201 @@ class MultilinePrinter:
         if printer._index is None:
             return
         message = printer._format()
-        self._print_queue.put((message, printer._index))
+        with self._lock:
+            # only the latest message of a line matters for the next frame
+            self._pending[printer._index] = (message, printer._status)
+        self._dirty.set()
 
     def terminate(self):
-        self._finished = True
-
-    def _loop_over_queue(self):
-        while not self._finished or not self._print_queue.empty():
-            try:
-                message, line = self._print_queue.get(block=True, timeout=0.1)
-                message = self._with_command_name(message)
-                self._all_messages[line] = message
-                self._update()
-            except queue.Empty:
-                pass
+        """
+        Render the last frame and stop the render thread.
+        """
+        self._terminated.set()
+        self._dirty.set()
+        if threading.current_thread() is not self._print_thread:
+            self._print_thread.join()
+
+    def _render_loop(self):
+        frame_interval = 1 / self.max_fps if self.max_fps > 0 else 0
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            finished = self._terminated.is_set()
+
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+
+            if len(pending) > 0:
+                for line, (message, status) in pending.items():
+                    self._all_messages[line] = self._with_command_name(message)
+                    self._update_status(line, status)
+                self._render_frame()
+
+            if finished:
+                break
+
+            # merge everything printed during the interval into the next frame
+            self._terminated.wait(frame_interval)
 
     def _with_command_name(self, message: str) -> str:
         if self.command_name is None:
             return message
         return f"\033[0;34m[{self.command_name}]\033[0m {message}"
 
+    def _get_height(self):
+        try:
+            return shutil.get_terminal_size().lines
+        except AttributeError:
+            return 0
+
     def _get_width(self):
         try:
             columns = shutil.get_terminal_size().columns
             return columns
         except AttributeError:
             return 0
-        
-    def _update(self):
-        if self._already_printed:
-            self._erase_print_area()
-        self._update_messages()
-        self._already_printed = True
-
-    def _calc_lines(self, line: str) -> int:
-        def calc_line(line: str) -> int:
-            nlines = 0
-            while True:
-                if len(line) <= self.terminal_width:
-                    nlines += 1
-                    break
-                else:
-                    nlines += 1
-                    line = line[self.terminal_width:]
-
-            return nlines
-            
-        line = core.remove_escape_sequences(line)
-
-        lines = line.split('\n')
-
-        nlines = 0
-        for line in lines:
-            nlines += calc_line(line)
 
-        return nlines
-    
-    def _update_messages(self):
-        if not self.enabled:
-            return
-        self._line_flashed = 0
-        for i in range(self.nlines):
-            self._line_flashed += self._calc_lines(self._all_messages[i])
-            self.out.write(self._all_messages[i])
-            self.out.write('\n')
-
-    def _erase_print_area(self):
+    def _render_frame(self):
         if not self.enabled:
             return
-        if self._line_flashed == 0:
-            return
 
-        code = '\033[1G' + '\033[A'*(self._line_flashed) + '\033[0J'
+        lines: list[str] = []
+        rows: list[int] = []
+        if self.viewport is not True:
+            for message in self._all_messages:
+                lines.extend(message.split('\n'))
+            rows = [self._calc_lines(line) for line in lines]
+        if self._use_viewport(sum(rows)):
+            lines, rows = self._viewport_lines()
+
+        old_lines = self._rendered_lines
+        old_rows = self._rendered_rows
+        total_rows = sum(old_rows)
+
+        # from the first line whose height changed, everything below has moved and is redrawn
+        redraw_from = len(lines)
+        for i in range(len(lines)):
+            if i >= len(old_lines) or rows[i] != old_rows[i]:
+                redraw_from = i
+                break
+        if len(old_lines) > len(lines):
+            redraw_from = min(redraw_from, len(lines))
+
+        # the cursor always rests at the first column below the print area
+        code: list[str] = []
+        row = 0
+        for i in range(redraw_from):
+            if lines[i] != old_lines[i]:
+                code.append('\033[1G' + f'\033[{total_rows - row}A')
+                code.append(lines[i] + '\033[0K')
+                code.append('\033[1G' + f'\033[{total_rows - row - rows[i] + 1}B')
+            row += rows[i]
+
+        if redraw_from < len(lines) or len(old_lines) > len(lines):
+            if total_rows - row > 0:
+                code.append('\033[1G' + f'\033[{total_rows - row}A')
+            code.append('\033[0J')
+            for line in lines[redraw_from:]:
+                code.append(line + '\n')
         # '\033[1G' move the cursor to the beginning of the line
-        # '\033[A' move the cursor up
-        # '\033[0J' clear from cursor to end of screen
+        # '\033[nA' / '\033[nB' move the cursor up / down n lines
+        # '\033[0K' clear from cursor to end of line, '\033[0J' clear from cursor to end of screen
+
+        self._rendered_lines = lines
+        self._rendered_rows = rows
+
+        if len(code) > 0:
+            self.out.write(''.join(code))
+            self.out.flush()
+
+    def _use_viewport(self, total_rows: int) -> bool:
+        if self.viewport is not None:
+            return self.viewport
+        # the cursor can't move above the top of the screen, so a taller area can't be redrawn in place;
+        # multi-line messages and wrapped lines count with all their rows
+        return self.terminal_height > 0 and total_rows >= self.terminal_height
+
+    def _update_status(self, line: int, status: LineStatus):
+        old_status = self._statuses[line]
+        if old_status == status:
+            return
+        self._statuses[line] = status
+        self._status_counts[old_status] -= 1
+        self._status_counts[status] += 1
+
+        self._running.pop(line, None)
+        self._failures.pop(line, None)
+        if status == "running":
+            self._running[line] = None
+        elif status == "fail":
+            self._failures[line] = None
+        elif status == "success" or status == "ignorable":
+            if line in self._recent:
+                self._recent.remove(line)
+            self._recent.append(line)
+
+    def _viewport_lines(self) -> tuple[list[str], list[int]]:
+        """
+        Failures are pinned at the top, then running and recently finished lines as far as they fit.
+        Finished lines that don't fit are only counted in the summary line at the bottom.
+        """
+        counts = self._status_counts
+        finished = counts["success"] + counts["ignorable"] + counts["fail"]
+        summary = self._with_command_name(
+            f"{finished}/{self.nlines} finished: "
+            f"\033[0;32m✓ {counts['success']}\033[0m, {counts['ignorable']} unchanged, \033[0;31m✗ {counts['fail']}\033[0m"
+            f" | {counts['running']} running, {counts['waiting']} waiting"
+        )
+        summary_rows = self._calc_lines(summary)
+        # one row stays free for the cursor below the print area
+        budget = max(1, self.terminal_height - 1 - summary_rows)
+        lines: list[str] = []
+        rows: list[int] = []
+
+        def append(line: int) -> bool:
+            nonlocal budget
+            message_lines = self._all_messages[line].split('\n')
+            message_rows = [self._calc_lines(message_line) for message_line in message_lines]
+            if sum(message_rows) > budget:
+                return False
+            budget -= sum(message_rows)
+            lines.extend(message_lines)
+            rows.extend(message_rows)
+            return True
+
+        for line in self._failures:
+            if not append(line): break
+
+        running = list(self._running)
+        # recently finished lines get whatever the running lines leave, newest last
+        recent_budget = budget
+        for line in running:
+            recent_budget -= self._calc_message_rows(self._all_messages[line])
+            if recent_budget <= 0: break
+        recent: list[int] = []
+        for line in reversed(self._recent):
+            if self._statuses[line] not in ("success", "ignorable"):
+                continue
+            height = self._calc_message_rows(self._all_messages[line])
+            if height > recent_budget: break
+            recent_budget -= height
+            recent.append(line)
+        for line in reversed(recent):
+            if not append(line): break
+
+        for line in running:
+            if not append(line): break
+
+        lines.append(summary)
+        rows.append(summary_rows)
+        return lines, rows
+
+    def _calc_message_rows(self, message: str) -> int:
+        return sum(self._calc_lines(line) for line in message.split('\n'))
 
-        self.out.write(code)
-        self.out.flush()
+    def _calc_lines(self, line: str) -> int:
+        line = core.remove_escape_sequences(line)
+        if self.terminal_width <= 0 or len(line) <= self.terminal_width:
+            return 1
+        return (len(line) + self.terminal_width - 1) // self.terminal_width
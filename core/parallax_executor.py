@@ -1,48 +1,176 @@
-from typing import Callable, Any, TypeVar
+from typing import Callable, Any, Protocol, TypeVar
+from dataclasses import dataclass, field
+from concurrent.futures import Future
 
+import itertools
 import threading
+import queue
+
+from .error import InternalError
 
 Argument = TypeVar("Argument")
 
+@dataclass(order=True)
+class _WorkItem:
+    priority: float
+    sequence: int
+    block: Callable[[Any], Any] | None = field(compare=False)
+    arg: Any = field(compare=False, default=None)
+    future: "Future[Any] | None" = field(compare=False, default=None)
+
+    @property
+    def is_sentinel(self) -> bool:
+        return self.block is None
+
+class Admission(Protocol):
+    def acquire(self, arg: Any): ...
+    def release(self, arg: Any): ...
+
 class ParallaxExecutor:
-    max_parallel: int
-    queue: list[
-        tuple[
-            Callable[[Any], None],
-            Any
-        ]
-    ]
-    current_parallel: int
-    threads: set[threading.Thread] = set()
+    """
+    A fixed pool of worker threads consuming a priority queue.
+    Lower priority values run first; equal priorities run in registration order.
+    An admission, if set, can hold a worker back before it runs its next item (see MemoryAdmission).
+    """
+    admission: Admission | None
+
+    _max_parallel: int
+    _queue: queue.PriorityQueue[_WorkItem]
+    _lock: threading.Lock
+    _workers: set[threading.Thread]
+    _worker_count: int
+    _sequence: itertools.count
+    _started: bool
+    _shutdown: bool
 
     def __init__(self, max_workers: int = 4) -> None:
-        self.max_parallel = max_workers
-        self.queue = []
-        self.current_parallel = 0
+        self.admission = None
+        self._max_parallel = max(1, max_workers)
+        self._queue = queue.PriorityQueue()
+        self._lock = threading.Lock()
+        self._workers = set()
+        self._worker_count = 0
+        self._sequence = itertools.count()
+        self._started = False
+        self._shutdown = False
 
-    def register(self, block: Callable[[Argument], None], arg: Argument = None):
-        self.queue.append((block, arg))
-        self._run()
+    @property
+    def max_parallel(self) -> int:
+        return self._max_parallel
+
+    @max_parallel.setter
+    def max_parallel(self, value: int):
+        with self._lock:
+            self._max_parallel = max(1, value)
+            if self._started and not self._shutdown:
+                self._spawn_workers()
+
+    def register(self, block: Callable[[Argument], Any], arg: Argument = None, priority: float = 0) -> "Future[Any]":
+        future: Future[Any] = Future()
+        with self._lock:
+            if self._shutdown:
+                raise InternalError("ParallaxExecutor is already shut down.")
+            self._queue.put(_WorkItem(priority=priority, sequence=next(self._sequence), block=block, arg=arg, future=future))
+            self._started = True
+            self._spawn_workers()
+        return future
 
     def join(self):
-        while len(self.threads) > 0:
-            self.threads.pop().join()
+        """
+        Wait until every registered block has finished. The workers stay alive.
+        """
+        self._queue.join()
 
-    def _run(self):
-        if self.current_parallel >= self.max_parallel:
-            return
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        with self._lock:
+            # from here on workers only leave through their sentinel, so there is exactly one per live worker
+            self._shutdown = True
+            workers = list(self._workers)
 
-        if len(self.queue) == 0:
-            return
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item.future is not None:
+                    item.future.cancel()
+                self._queue.task_done()
+
+        # sentinels sort after every pending task, so queued work is drained first
+        for _ in workers:
+            self._queue.put(_WorkItem(priority=float("inf"), sequence=next(self._sequence), block=None))
 
-        self.current_parallel += 1
-        block = self.queue.pop(0)
-        thread = threading.Thread(target=self._run_block, args=(block,))
-        thread.daemon = True
-        thread.start()
-        self.threads.add(thread)
-
-    def _run_block(self, block: tuple[Callable[[Any], None], Any]):
-        block[0](block[1])
-        self.current_parallel -= 1
-        self._run()
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def __enter__(self) -> "ParallaxExecutor":
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown(wait=True)
+
+    def _spawn_workers(self):
+        # must be called with self._lock held
+        while self._worker_count < self._max_parallel:
+            thread = threading.Thread(target=self._run_worker)
+            thread.daemon = True
+            self._worker_count += 1
+            self._workers.add(thread)
+            thread.start()
+
+    def _run_worker(self):
+        current = threading.current_thread()
+        while True:
+            item = self._queue.get()
+
+            if item.is_sentinel:
+                self._retire(current)
+                self._queue.task_done()
+                return
+
+            with self._lock:
+                retire = not self._shutdown and self._worker_count > self._max_parallel
+                if retire:
+                    self._workers.discard(current)
+                    self._worker_count -= 1
+            if retire:
+                # the pool was shrunk; hand the item back to a remaining worker
+                self._queue.put(item)
+                self._queue.task_done()
+                return
+
+            admission = self.admission
+            if admission is not None:
+                admission.acquire(item.arg)
+            try:
+                self._run_item(item)
+            except BaseException:
+                # SystemExit and the like end the worker; the waiter re-raises them from the future
+                self._retire(current)
+                raise
+            finally:
+                if admission is not None:
+                    admission.release(item.arg)
+                self._queue.task_done()
+
+    def _retire(self, thread: threading.Thread):
+        with self._lock:
+            if thread in self._workers:
+                self._workers.discard(thread)
+                self._worker_count -= 1
+
+    def _run_item(self, item: _WorkItem):
+        assert item.block is not None and item.future is not None
+        if not item.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = item.block(item.arg)
+        except Exception as e:
+            item.future.set_exception(e)
+        except BaseException as e:
+            item.future.set_exception(e)
+            raise
+        else:
+            item.future.set_result(result)
@@ -0,0 +1,199 @@
+from typing import Callable, Any, Generic, Hashable, Mapping, Protocol, TypeVar
+from concurrent.futures import Future, wait
+
+import threading
+import time
+
+from .parallax_executor import ParallaxExecutor
+from .dependency_graph import DependencyGraph
+from .duration_store import DurationStore
+from .multiline_printer import LineStatus
+
+spinner_frames = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
+
+class DrivenTask(Protocol):
+    finished: bool
+
+    @property
+    def name(self) -> str: ...
+
+    def print(self, message: str, status: LineStatus | None = None) -> None: ...
+
+Task = TypeVar("Task", bound=DrivenTask)
+Key = TypeVar("Key", bound=Hashable)
+
+class TaskDriver(Generic[Task]):
+    """
+    Runs tasks on a ParallaxExecutor and waits on their futures.
+    A single ticker thread animates the spinner of running tasks only.
+    With a DurationStore, the time from start() to finish() of each task is recorded and the slowest tasks are started first.
+    A block that raises fails its task with the exception as the reason.
+    """
+    executor: ParallaxExecutor
+    interval: float
+    durations: DurationStore | None
+    duration_key: Callable[[Task], str] | None
+
+    _futures: list["Future[Any]"]
+    _active: dict[int, tuple[Task, Callable[[Task, str], None]]]
+    _offsets: dict[int, int]
+    _started_at: dict[int, float]
+    _lock: threading.Lock
+    _stopped: threading.Event
+    _ticker: threading.Thread | None
+
+    def __init__(self, executor: ParallaxExecutor, interval: float = 0.1, durations: DurationStore | None = None, duration_key: Callable[[Task], str] | None = None) -> None:
+        self.executor = executor
+        self.interval = interval
+        self.durations = durations
+        self.duration_key = duration_key
+        self._futures = []
+        self._active = {}
+        self._offsets = {}
+        self._started_at = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._ticker = None
+
+    def register(self, block: Callable[[Task], Any], task: Task, spinner: Callable[[Task, str], None] | None = None, priority: float | None = None, executor: ParallaxExecutor | None = None, finish_on_return: bool = True) -> "Future[Any]":
+        """
+        Run the block on the executor (or another one, for a later stage of the task).
+        Pass finish_on_return=False if the block hands the task over to a next stage instead of finishing it.
+        Without an explicit priority, tasks expected to take longest run first.
+        """
+        if priority is None:
+            priority = -self.expected_duration(task)
+
+        def run(task: Task):
+            if spinner is not None:
+                self.start(task, spinner)
+            try:
+                result = block(task)
+            except Exception as e:
+                if not task.finished:
+                    self.finish(task, failed=True)
+                task.print(f"\033[0;31m✗\033[0m {task.name}: {str(e) or type(e).__name__}", "fail")
+                return None
+            except BaseException:
+                if not task.finished:
+                    self.finish(task, failed=True)
+                raise
+            if not task.finished and finish_on_return:
+                self.finish(task)
+            return result
+
+        return self.track((executor or self.executor).register(run, task, priority=priority))
+
+    def register_all(self, block: Callable[[Task], Any], tasks: list[Task], spinner: Callable[[Task, str], None] | None = None, executor: ParallaxExecutor | None = None, finish_on_return: bool = True):
+        """
+        register() every task, the ones expected to take longest first.
+        """
+        for task in sorted(tasks, key=lambda task: -self.expected_duration(task)):
+            self.register(block, task, spinner=spinner, executor=executor, finish_on_return=finish_on_return)
+
+    def register_graph(self, block: Callable[[Task], Any], graph: DependencyGraph[Key], tasks: Mapping[Key, Task], spinner: Callable[[Task, str], None] | None = None):
+        """
+        Run a task only after the tasks it depends on have finished.
+        Ready tasks on the longest remaining chain of dependents start first.
+        """
+        remaining = {key: len(graph.dependencies(key)) for key in graph.nodes}
+        if self.durations is not None:
+            priorities = graph.critical_paths(lambda key: self.expected_duration(tasks[key]))
+        else:
+            priorities = graph.critical_paths()
+        lock = threading.Lock()
+
+        def schedule(key: Key):
+            def run(task: Task):
+                try:
+                    return block(task)
+                finally:
+                    ready: list[Key] = []
+                    with lock:
+                        for dependent in graph.dependents(key):
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                ready.append(dependent)
+                    for dependent in ready:
+                        schedule(dependent)
+
+            self.register(run, tasks[key], spinner=spinner, priority=-priorities[key])
+
+        # a worker takes the first task as soon as it is registered, so register the longest first
+        for key in sorted(graph.nodes, key=lambda key: -priorities[key]):
+            if remaining[key] == 0:
+                schedule(key)
+
+    def expected_duration(self, task: Task) -> float:
+        if self.durations is None or self.duration_key is None:
+            return 0
+        return self.durations.expected(self.duration_key(task))
+
+    def track(self, future: "Future[Any]") -> "Future[Any]":
+        """
+        Make wait() also wait for a future that was not registered through this driver.
+        """
+        self._futures.append(future)
+        return future
+
+    def start(self, task: Task, spinner: Callable[[Task, str], None]):
+        """
+        Start animating the spinner of a running task.
+        """
+        with self._lock:
+            offset = self._offsets.setdefault(id(task), len(self._offsets))
+            self._active[id(task)] = (task, spinner)
+            self._started_at.setdefault(id(task), time.monotonic())
+            spinner(task, spinner_frames[offset % len(spinner_frames)])
+            self._start_ticker()
+
+    def finish(self, task: Task, on_finish: Callable[[], None] | None = None, failed: bool = False):
+        """
+        Stop the spinner of the task and mark it finished. Anything printed afterwards can't be overwritten by a spinner frame.
+        The duration of a failed task isn't recorded, since it says nothing about the next run.
+        """
+        with self._lock:
+            self._active.pop(id(task), None)
+            started_at = self._started_at.pop(id(task), None)
+            if started_at is not None and not failed and self.durations is not None and self.duration_key is not None:
+                self.durations.record(self.duration_key(task), time.monotonic() - started_at)
+            if on_finish is not None:
+                on_finish()
+            task.finished = True
+
+    def wait(self):
+        # blocks may register follow-up stages, so keep waiting until no new futures appear
+        waited = 0
+        while waited < len(self._futures):
+            futures = self._futures[waited:]
+            wait(futures)
+            waited += len(futures)
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.join()
+        if self.durations is not None:
+            self.durations.save()
+
+        # registered blocks report their own exceptions; what is left comes from track() or is a BaseException such as SystemExit
+        for future in self._futures:
+            exception = None if future.cancelled() else future.exception()
+            if exception is not None:
+                raise exception
+
+    def _start_ticker(self):
+        if self._ticker is not None:
+            return
+        self._ticker = threading.Thread(target=self._tick_loop)
+        self._ticker.daemon = True
+        self._ticker.start()
+
+    def _tick_loop(self):
+        tick = 1
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                for task, spinner in self._active.values():
+                    spinner(task, self._frame(task, tick))
+            tick += 1
+
+    def _frame(self, task: Task, tick: int) -> str:
+        return spinner_frames[(tick + self._offsets[id(task)]) % len(spinner_frames)]
@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+class TreeFingerprint:
+    """
+    Content hash of a directory tree.
+    File digests are cached by (inode, size, mtime_ns), so an unchanged file costs a stat only.
+    """
+    cache_version = 1
+    mmap_threshold = 1024 * 1024
+    # a file modified within this window could change again without its mtime changing
+    racy_window_ns = 2_000_000_000
+
+    cache_path: Path | None
+    ignored_directories: set[str]
+    max_workers: int
+
+    _cache: dict[str, dict[str, list]]
+    _lock: threading.Lock
+
+    def __init__(self, cache_path: Path | None = None, ignored_directories: set[str] = {".build", ".build-trash", ".git", ".swiftpm"}, max_workers: int = 8) -> None:
+        self.cache_path = cache_path
+        self.ignored_directories = ignored_directories
+        self.max_workers = max_workers
+        self._cache = self._load()
+        self._lock = threading.Lock()
+
+    def fingerprint(self, root: Path) -> str:
+        return self.fingerprint_many([root])[0]
+
+    def fingerprint_many(self, roots: list[Path]) -> list[str]:
+        """
+        Fingerprints of several trees. The stale files of all of them are hashed together on one pool.
+        """
+        now_ns = time.time_ns()
+        listings: list[tuple[str, list[tuple[str, os.stat_result]]]] = []
+        for root in roots:
+            key = str(root.absolute())
+            listings.append((key, self._list_files(Path(key))))
+
+        digests: list[dict[str, str]] = []
+        stale: list[tuple[int, str, str]] = []
+        with self._lock:
+            for index, (key, files) in enumerate(listings):
+                cached = self._cache.get(key, {})
+                known: dict[str, str] = {}
+                for relpath, stat in files:
+                    entry = cached.get(relpath)
+                    if entry is not None and entry[:3] == [stat.st_ino, stat.st_size, stat.st_mtime_ns]:
+                        known[relpath] = entry[3]
+                    else:
+                        stale.append((index, key, relpath))
+                digests.append(known)
+
+        if len(stale) > 0:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                hashed = list(executor.map(lambda item: self._hash_file(Path(item[1]) / item[2]), stale))
+            for (index, _, relpath), digest in zip(stale, hashed):
+                if digest is not None:
+                    digests[index][relpath] = digest
+
+        fingerprints: list[str] = []
+        with self._lock:
+            for (key, files), known in zip(listings, digests):
+                entries: dict[str, list] = {}
+                tree_digest = hashlib.sha256()
+                for relpath, stat in sorted(files, key=lambda file: file[0]):
+                    digest = known.get(relpath)
+                    if digest is None:
+                        continue
+                    tree_digest.update(f"{relpath}\0{digest}\0".encode("utf-8"))
+                    if now_ns - stat.st_mtime_ns > self.racy_window_ns:
+                        entries[relpath] = [stat.st_ino, stat.st_size, stat.st_mtime_ns, digest]
+                self._cache[key] = entries
+                fingerprints.append(tree_digest.hexdigest())
+        return fingerprints
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        with self._lock:
+            data = {"version": self.cache_version, "trees": self._cache}
+            try:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.cache_path)
+            except OSError:
+                pass
+
+    def _list_files(self, root: Path) -> list[tuple[str, os.stat_result]]:
+        files: list[tuple[str, os.stat_result]] = []
+        stack = [""]
+        while len(stack) > 0:
+            relpath = stack.pop()
+            try:
+                with os.scandir(root / relpath if relpath else root) as iterator:
+                    for entry in iterator:
+                        child = f"{relpath}/{entry.name}" if relpath else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in self.ignored_directories:
+                                    stack.append(child)
+                            elif entry.is_file():
+                                files.append((child, entry.stat()))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    def _hash_file(self, path: Path) -> str | None:
+        # hashlib releases the GIL on large buffers, so threads are enough to use every core
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size >= self.mmap_threshold:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        digest.update(mapped)
+                else:
+                    digest.update(f.read())
+        except (OSError, ValueError):
+            return None
+        return digest.hexdigest()
+
+    def _load(self) -> dict[str, dict[str, list]]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != self.cache_version:
+                return {}
+            return dict(data["trees"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
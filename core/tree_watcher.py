@@ -0,0 +1,226 @@
+from pathlib import Path
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+class TreeWatcher:
+    """
+    Reports which of several directory trees changed.
+    Uses inotify where the platform has it, and otherwise compares stat snapshots of the trees every poll_interval.
+    Ignored directories aren't watched, except for the watched_subdirectories of each root (e.g. .git/refs/heads).
+    """
+    _IN_MODIFY = 0x2
+    _IN_ATTRIB = 0x4
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_DELETE_SELF = 0x400
+    _IN_MOVE_SELF = 0x800
+    _IN_Q_OVERFLOW = 0x4000
+    _IN_IGNORED = 0x8000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+    _watch_mask = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+    _event_header = struct.Struct("iIII")
+
+    roots: list[Path]
+    ignored_directories: set[str]
+    watched_subdirectories: list[str]
+    poll_interval: float
+
+    _fd: int | None
+    _libc: ctypes.CDLL | None
+    _watches: dict[int, tuple[int, Path]]
+    _snapshots: list[dict[str, tuple[int, int, int]]]
+    _pending: dict[int, float]
+
+    def __init__(self, roots: list[Path], ignored_directories: set[str] = {".build", ".build-trash", ".git", ".swiftpm"}, watched_subdirectories: list[str] = [], poll_interval: float = 2.0, use_inotify: bool = True) -> None:
+        self.roots = list(roots)
+        self.ignored_directories = ignored_directories
+        self.watched_subdirectories = watched_subdirectories
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._libc = None
+        self._watches = {}
+        self._snapshots = []
+        self._pending = {}
+
+        if use_inotify and self._start_inotify():
+            return
+        self._snapshots = [self._snapshot(index) for index in range(len(self.roots))]
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._fd is not None else "polling"
+
+    def wait(self, debounce: float, timeout: float | None = None) -> list[Path]:
+        """
+        Block until some trees changed and then stayed unchanged for debounce seconds, and return those roots in order.
+        Each tree settles on its own, so one that keeps changing doesn't hold back the others.
+        Returns an empty list if no tree settled within timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            now = time.monotonic()
+            settled = {index for index, changed_at in self._pending.items() if now - changed_at >= debounce}
+            if len(settled) > 0:
+                for index in settled:
+                    del self._pending[index]
+                return [root for index, root in enumerate(self.roots) if index in settled]
+
+            waits = [changed_at + debounce - now for changed_at in self._pending.values()]
+            if deadline is not None:
+                if deadline <= now:
+                    return []
+                waits.append(deadline - now)
+            for index in self._changes(max(0.0, min(waits)) if len(waits) > 0 else None):
+                self._pending[index] = time.monotonic()
+
+    def add_roots(self, roots: list[Path]):
+        """
+        Start watching more trees, e.g. packages created after the watcher.
+        """
+        for root in roots:
+            if root in self.roots:
+                continue
+            self.roots.append(root)
+            index = len(self.roots) - 1
+            if self._fd is not None:
+                self._add_watches(index, self._directories(index))
+            else:
+                self._snapshots.append(self._snapshot(index))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _changes(self, timeout: float | None) -> set[int]:
+        if self._fd is not None:
+            return self._read_events(timeout)
+
+        # a snapshot can take a while on large trees, so the timeout counts from the start of the previous one
+        deadline = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while True:
+            started = time.monotonic()
+            changed: set[int] = set()
+            for index in range(len(self.roots)):
+                snapshot = self._snapshot(index)
+                if snapshot != self._snapshots[index]:
+                    self._snapshots[index] = snapshot
+                    changed.add(index)
+            if len(changed) > 0 or time.monotonic() >= deadline:
+                return changed
+            time.sleep(max(0.0, min(self.poll_interval - (time.monotonic() - started), deadline - time.monotonic())))
+
+    def _snapshot(self, index: int) -> dict[str, tuple[int, int, int]]:
+        snapshot: dict[str, tuple[int, int, int]] = {}
+        for directory in self._directories(index):
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        if self._is_ignored(directory, entry.name):
+                            continue
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        snapshot[entry.path] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return snapshot
+
+    def _directories(self, index: int, start: Path | None = None) -> list[Path]:
+        """
+        The watched directories of a root, or of the part of it below start.
+        """
+        root = self.roots[index]
+        stack = [start] if start is not None else [root] + [root / subdirectory for subdirectory in self.watched_subdirectories]
+        directories: list[Path] = []
+        while len(stack) > 0:
+            directory = stack.pop()
+            directories.append(directory)
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        if entry.is_dir(follow_symlinks=False) and not self._is_ignored(directory, entry.name):
+                            stack.append(Path(entry.path))
+            except OSError:
+                continue
+        return directories
+
+    def _is_ignored(self, directory: Path, name: str) -> bool:
+        # only the top of a root is ignored by name; the watched subdirectories are taken whole
+        return name in self.ignored_directories and any(directory == root for root in self.roots)
+
+    def _start_inotify(self) -> bool:
+        if not hasattr(select, "poll") or ctypes.util.find_library("c") is None:
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        self._libc = libc
+        self._fd = fd
+
+        for index in range(len(self.roots)):
+            if not self._add_watches(index, self._directories(index)):
+                # most likely over fs.inotify.max_user_watches
+                self.close()
+                return False
+        return True
+
+    def _add_watches(self, index: int, directories: list[Path]) -> bool:
+        assert self._libc is not None
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self._watch_mask)
+            if wd < 0:
+                if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                return False
+            self._watches[wd] = (index, directory)
+        return True
+
+    def _read_events(self, timeout: float | None) -> set[int]:
+        assert self._fd is not None
+        poll = select.poll()
+        poll.register(self._fd, select.POLLIN)
+        if len(poll.poll(None if timeout is None else int(timeout * 1000))) == 0:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: set[int] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._event_header.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + self._event_header.size:offset + self._event_header.size + length].rstrip(b"\0"))
+            offset += self._event_header.size + length
+
+            if mask & self._IN_Q_OVERFLOW:
+                changed |= set(range(len(self.roots)))
+                continue
+            watch = self._watches.get(wd)
+            if watch is None:
+                continue
+            index, directory = watch
+            if mask & self._IN_IGNORED:
+                del self._watches[wd]
+                continue
+            if name != "" and self._is_ignored(directory, name):
+                continue
+            if mask & self._IN_ISDIR and mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                self._add_watches(index, self._directories(index, directory / name))
+            changed.add(index)
+        return changed
@@ -0,0 +1,90 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import subprocess
+
+import core
+
+class ManifestCache:
+    """
+    Output of `swift package dump-package`, cached per package.
+    An entry is valid while the manifests and Package.resolved are byte-for-byte the same.
+    """
+    cache_version = 1
+
+    file_manager: core.FileManager | None
+    max_workers: int
+
+    def __init__(self, file_manager: core.FileManager | None, max_workers: int = 8) -> None:
+        self.file_manager = file_manager
+        self.max_workers = max_workers
+
+    def load(self, package_path: Path) -> dict | core.CommandResult:
+        return self.load_many([package_path])[0]
+
+    def load_many(self, package_pathes: list[Path]) -> list[dict | core.CommandResult]:
+        """
+        Parsed manifests of the packages, or a fail result. Misses are dumped in parallel.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self._load, package_pathes))
+
+    def _load(self, package_path: Path) -> dict | core.CommandResult:
+        key = self.manifest_key(package_path)
+        entry_path = self._entry_path(package_path)
+        if key is not None and entry_path is not None and entry_path.exists():
+            try:
+                with open(entry_path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == self.cache_version and data.get("key") == key:
+                    return data["manifest"]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        result = subprocess.run(["swift", "package", "dump-package"], cwd=package_path, capture_output=True, text=True)
+        if not result.returncode == 0:
+            lines = [line for line in result.stderr.split("\n") if line.strip() != ""]
+            return core.CommandResult.fail(lines[-1].removeprefix("error: ") if len(lines) > 0 else f"dump-package failed with return code {result.returncode}.")
+        try:
+            manifest = json.loads(result.stdout)
+        except ValueError:
+            return core.CommandResult.fail("Failed to parse the output of dump-package.")
+
+        if key is not None and entry_path is not None:
+            self._save(entry_path, {"version": self.cache_version, "key": key, "path": str(package_path.absolute()), "manifest": manifest})
+        return manifest
+
+    @staticmethod
+    def manifest_key(package_path: Path) -> str | None:
+        """
+        Hash of the location, the Package*.swift manifests and Package.resolved of a package.
+        """
+        # dump-package resolves local dependencies to absolute paths, so the location is part of the key
+        digest = hashlib.sha256(str(package_path.absolute()).encode("utf-8"))
+        try:
+            names = sorted(name for name in os.listdir(package_path) if name.startswith("Package") and (name.endswith(".swift") or name == "Package.resolved"))
+            for name in names:
+                with open(package_path / name, "rb") as f:
+                    digest.update(f"\0{name}\0".encode("utf-8"))
+                    digest.update(f.read())
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    def _entry_path(self, package_path: Path) -> Path | None:
+        if self.file_manager is None:
+            return None
+        name = hashlib.sha1(str(package_path.absolute()).encode("utf-8")).hexdigest()
+        return self.file_manager.command_directory() / "manifest" / f"{name}.json"
+
+    def _save(self, path: Path, data: dict):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
@@ -0,0 +1,87 @@
+from pathlib import Path
+import json
+import re
+
+import core
+
+class PackageManifest:
+    """
+    Reads what can be read from Package.swift without running SwiftPM.
+    """
+    _path_dependency_pattern = re.compile(r'\.package\s*\((?:\s*name\s*:\s*"[^"]*"\s*,)?\s*path\s*:\s*"((?:[^"\\]|\\.)*)"')
+    _remote_dependency_pattern = re.compile(r'\.package\s*\((?:\s*name\s*:\s*"[^"]*"\s*,)?\s*(?:url|id)\s*:')
+    _url_dependency_pattern = re.compile(r'\.package\s*\((?:\s*name\s*:\s*"[^"]*"\s*,)?\s*url\s*:\s*"((?:[^"\\]|\\.)*)"')
+    # string literals are matched too, so that the `//` of a URL isn't taken for a comment
+    _comment_pattern = re.compile(r'"(?:[^"\\\n]|\\.)*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+    package_path: Path
+
+    def __init__(self, package_path: Path) -> None:
+        self.package_path = package_path
+
+    def local_dependencies(self) -> list[Path]:
+        """
+        Resolved paths of the `.package(path:)` dependencies that exist on disk.
+        """
+        text = self._read()
+        dependencies: list[Path] = []
+        for match in self._path_dependency_pattern.finditer(text):
+            path = (self.package_path / match.group(1)).resolve()
+            if (path / "Package.swift").exists() and path not in dependencies:
+                dependencies.append(path)
+        return dependencies
+
+    def has_remote_dependencies(self) -> bool:
+        """
+        Whether Package.swift declares `.package(url:)` or registry dependencies.
+        """
+        return self._remote_dependency_pattern.search(self._read()) is not None
+
+    def remote_urls(self) -> list[str]:
+        """
+        URLs of the source control dependencies, declared in Package.swift or pinned in Package.resolved.
+        Declared ones count even before they are resolved; pins add the transitive dependencies of the last resolution.
+        """
+        urls = [match.group(1) for match in self._url_dependency_pattern.finditer(self._read())]
+        urls += [location for location, _ in self.resolved_pins().values() if location is not None]
+        return list(dict.fromkeys(urls))
+
+    def resolved_pins(self) -> dict[str, tuple[str | None, str | None]]:
+        """
+        identity -> (location, revision) of the pins in Package.resolved.
+        """
+        try:
+            with open(self.package_path / "Package.resolved", "r") as f:
+                resolved = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(resolved, dict):
+            return {}
+        # version 1 nests the pins in "object" and has no identities
+        pins = resolved.get("pins") or resolved.get("object", {}).get("pins", [])
+        result: dict[str, tuple[str | None, str | None]] = {}
+        for pin in pins:
+            location = pin.get("location") or pin.get("repositoryURL")
+            identity = pin.get("identity") or self._identity(location or "")
+            result[identity] = (location, pin.get("state", {}).get("revision"))
+        return result
+
+    @staticmethod
+    def _identity(url: str) -> str:
+        return url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git").lower()
+
+    def _read(self) -> str:
+        try:
+            with open(self.package_path / "Package.swift", "r", encoding="utf-8", errors="replace") as f:
+                return self._comment_pattern.sub(lambda match: match.group(0) if match.group(0).startswith('"') else "", f.read())
+        except OSError:
+            return ""
+
+    @staticmethod
+    def dependency_graph(package_pathes: list[Path]) -> core.DependencyGraph[Path]:
+        """
+        The graph of local dependencies between the given packages, keyed by their resolved paths.
+        """
+        keys = [path.resolve() for path in package_pathes]
+        dependencies = {key: PackageManifest(key).local_dependencies() for key in keys}
+        return core.DependencyGraph(keys, lambda key: dependencies[key])
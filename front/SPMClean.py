@@ -1,92 +1,255 @@
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 import subprocess
-from dataclasses import dataclass
+import hashlib
+import shutil
+import os
+from uuid import uuid4 as uuid
+from dataclasses import dataclass, field
 
 import core
 import front
-import time
 import git
+from .TestCache import TestCache
 
 @dataclass
 class CleanTask:
     package_path: Path
     printer: core.SingleLinePrinter
     finished = False
+    stage: str = "Cleaning"
+    trash: list[Path] = field(default_factory=list)
+    reclaimed: int = 0
 
     @property
     def name(self):
         return self.package_path.absolute().name
-    
-    def print(self, message: str):
-        self.printer.print(message)
+
+    def print(self, message: str, status: core.LineStatus | None = None):
+        self.printer.print(message, status)
 
 class SPMClean:
     parser: ArgumentParser
     default_root_path: Path
     logger: core.Logger
+    file_manager: core.FileManager | None
     parallax_executor: core.ParallaxExecutor
+    trash_executor: core.ParallaxExecutor
+    task_driver: core.TaskDriver
+
+    # used where the command directory is on another file system; TreeFingerprint and TreeWatcher ignore it
+    trash_name = ".build-trash"
+
+    _shared_trash: tuple[Path, int] | None
 
-    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None) -> None:
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
         self.default_root_path = default_root_path
         self.logger = logger
+        self.file_manager = file_manager
         self.parallax_executor = core.ParallaxExecutor()
+        self.trash_executor = core.ParallaxExecutor(max_workers=4)
+        self._shared_trash = None
         self.parser = parser or ArgumentParser(description="SwiftPM Clean")
         self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
-        self.parser.add_argument("-p", "--parallel", type=int, default=4, help="Number of parallel processes.")
-        
+        self.parser.add_argument("-p", "--parallel", type=core.parallel_argument, default=4, help="Number of parallel processes, or auto.")
+        self.parser.add_argument("--fast", action="store_true", help="Remove the whole .build directory without running SwiftPM, and report the reclaimed space.")
+        self.parser.add_argument("--max-size", type=core.size_argument, help="Only remove the .build directories of the least recently used packages until all of them fit in this size (e.g. 20G). Implies --fast.")
+
     def run(self, args: Namespace):
         root_path: Path = self.default_root_path if args.root is None else Path(args.root)
-        parallel_count = args.parallel or 4
-        self.parallax_executor.max_parallel = parallel_count
-        
-        package_pathes = list(front.SPMFind(root_path).find())
+        concurrency = core.AdaptiveConcurrency.apply(self.parallax_executor, args.parallel or 4, "io")
+
+        package_pathes = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
         printer = core.MultilinePrinter(len(package_pathes), disable_input=True, command_name=self.logger.command_name)
 
+        self.task_driver = core.TaskDriver(
+            self.parallax_executor,
+            durations=core.DurationStore.of_command(self.file_manager, "clean"),
+            duration_key=lambda task: str(task.package_path.absolute())
+        )
         tasks: list[CleanTask] = []
         for i, package_path in enumerate(package_pathes):
             task = CleanTask(package_path=package_path, printer=printer.printer(i))
             tasks.append(task)
-            self.parallax_executor.register(self._run_task, task)
-    
-        # rotate spinner
-        spinner = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        spinner_index = 0
-        
-        while True:
-            for i, task in enumerate(tasks):
-                if task.finished: continue
-                index = (spinner_index + i) % len(spinner)
-                task.print(f"{spinner[index]} Cleaning: {task.name}...")
-            
-            spinner_index = spinner_index + 1
-            time.sleep(0.1)
-
-            if all([task.finished for task in tasks]):
-                break
-
-        self.parallax_executor.join()
+            task.print(f"Waiting: {task.name}")
+        if args.fast or args.max_size is not None:
+            self._shared_trash = self._load_shared_trash()
+        if args.max_size is not None:
+            evicted = self._select_evicted(tasks, args.max_size)
+            self.task_driver.register_all(self._run_fast_task, evicted, spinner=self._spin, finish_on_return=False)
+        elif args.fast:
+            self.task_driver.register_all(self._run_fast_task, tasks, spinner=self._spin, finish_on_return=False)
+        else:
+            self.task_driver.register_all(self._run_task, tasks, spinner=self._spin)
+
+        self.task_driver.wait()
+        concurrency.stop()
         printer.terminate()
 
-    def _run_task(self, task: CleanTask):
-        def display_result(result: core.CommandResult):
-            if result.type == "success":
-                task.print(f"\033[0m\033[0;32m✓\033[0m Clean: {task.name}{result.appendics_message()}")
-            elif result.type == "fail":
-                task.print(f"\033[0;31m✗\033[0m Clean failed: {task.name}{result.appendics_message()}")
-            elif result.type == "ignorable":
-                task.print(f"Nothing to clean: {task.name}")
+        if args.fast or args.max_size is not None:
+            self.logger.log(f"Reclaimed {core.format_bytes(sum(task.reclaimed for task in tasks))}")
+
+    def _select_evicted(self, tasks: list[CleanTask], max_size: int) -> list[CleanTask]:
+        """
+        The least recently used packages whose .build directories have to go for the rest to fit in max_size.
+        The other tasks are finished as kept.
+        """
+        last_runs = TestCache.last_runs(self.file_manager) if self.file_manager is not None else {}
+        # listing a directory updates its atime, so the last use has to be read before scanning
+        last_uses = [max(self._last_build_use(task.package_path / ".build"), last_runs.get(str(task.package_path.absolute()), 0)) for task in tasks]
+
+        # the scan cache misses files that grew in place, so what gets evicted is decided on an exact scan
+        sizes = core.DiskUsageScanner(use_cache=False).scan([task.package_path / ".build" for task in tasks])
+
+        total = sum(sizes)
+        evicted: list[CleanTask] = []
+        for task, size, _ in sorted(zip(tasks, sizes, last_uses), key=lambda item: item[2]):
+            if size == 0:
+                task.finished = True
+                task.print(f"Nothing to clean: {task.name}", "ignorable")
+            elif total > max_size:
+                evicted.append(task)
+                total -= size
+            else:
+                task.finished = True
+                task.print(f"Kept: {task.name} ({core.format_bytes(size)})", "ignorable")
+        return evicted
+
+    @staticmethod
+    def _last_build_use(build_path: Path) -> float:
+        """
+        SwiftPM reads and rewrites files such as build.db and workspace-state.json at the top of .build on every build.
+        Only the mtime of directories counts, since their atime changes whenever they are listed.
+        """
+        last_use = 0.0
+        try:
+            with os.scandir(build_path) as iterator:
+                for entry in iterator:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        last_use = max(last_use, stat.st_mtime)
+                    else:
+                        last_use = max(last_use, stat.st_atime, stat.st_mtime)
+        except OSError:
+            pass
+        return last_use
+
+    def _spin(self, task: CleanTask, frame: str):
+        task.print(f"{frame} {task.stage}: {task.name}...", "running")
 
+    def _display_result(self, task: CleanTask, result: core.CommandResult):
+        if result.type == "success":
+            task.print(f"\033[0m\033[0;32m✓\033[0m Clean: {task.name}{result.appendics_message()}", result.type)
+        elif result.type == "fail":
+            task.print(f"\033[0;31m✗\033[0m Clean failed: {task.name}{result.appendics_message()}", result.type)
+        elif result.type == "ignorable":
+            task.print(f"Nothing to clean: {task.name}", result.type)
+
+    def _run_task(self, task: CleanTask):
         result = self._run_clean(task)
-        task.finished = True
-        display_result(result)
+        self.task_driver.finish(task)
+        self._display_result(task, result)
 
     def _run_clean(self, task: CleanTask) -> core.CommandResult:
+        if not (task.package_path / ".build").exists():
+            return core.CommandResult.ignorable()
+
         result = subprocess.run(["swift", "package", "clean"], cwd=task.package_path, capture_output=True, text=True)
 
         if not result.returncode == 0:
             return core.CommandResult.fail(f"Clean failed with return code {result.returncode}.")
 
-        return core.CommandResult.success()        
+        return core.CommandResult.success()
+
+    def _run_fast_task(self, task: CleanTask):
+        result = self._move_to_trash(task)
+        if result.type != "success" or len(task.trash) == 0:
+            self.task_driver.finish(task)
+            self._display_result(task, result)
+            return
+
+        # the package is already clean; only the deletion is left
+        task.stage = "Deleting"
+        self.task_driver.register(self._delete_trash, task, spinner=self._spin, executor=self.trash_executor)
+
+    def _load_shared_trash(self) -> tuple[Path, int] | None:
+        if self.file_manager is None:
+            return None
+        trash_directory = self.file_manager.command_directory() / "trash"
+        try:
+            trash_directory.mkdir(exist_ok=True)
+            return trash_directory, os.stat(trash_directory).st_dev
+        except OSError:
+            return None
+
+    def _move_to_trash(self, task: CleanTask) -> core.CommandResult:
+        # a rename is instant but can't cross file systems, so the trash has to be on the device of the package
+        try:
+            device = os.stat(task.package_path).st_dev
+        except OSError as e:
+            return core.CommandResult.fail(str(e))
+        if self._shared_trash is not None and self._shared_trash[1] == device:
+            # outside the worktree, so that neither git nor the watchers see the trash
+            trash_directory = self._shared_trash[0]
+            prefix = hashlib.sha1(str(task.package_path.absolute()).encode("utf-8")).hexdigest()[:12] + "-"
+        else:
+            trash_directory = task.package_path / self.trash_name
+            prefix = ""
+
+        # trash left over by an interrupted run is deleted as well
+        try:
+            task.trash = [path for path in trash_directory.iterdir() if path.name.startswith(prefix)] if trash_directory.exists() else []
+        except OSError as e:
+            return core.CommandResult.fail(str(e))
+
+        build_path = task.package_path / ".build"
+        if build_path.exists():
+            trash_path = trash_directory / f"{prefix}{uuid().hex}"
+            try:
+                if trash_directory.name == self.trash_name:
+                    self._exclude_from_git(task.package_path)
+                trash_directory.mkdir(exist_ok=True)
+                build_path.rename(trash_path)
+            except OSError as e:
+                return core.CommandResult.fail(f"Failed to move .build: {e}")
+            task.trash.append(trash_path)
+
+        if len(task.trash) == 0:
+            return core.CommandResult.ignorable()
+        return core.CommandResult.success()
+
+    def _exclude_from_git(self, package_path: Path):
+        metadata = git.GitMetadata.load(package_path)
+        if metadata is None:
+            return
+        exclude_path = metadata.common_dir / "info" / "exclude"
+        pattern = f"/{self.trash_name}/"
+        try:
+            with open(exclude_path, "r") as f:
+                if pattern in f.read().split("\n"):
+                    return
+        except FileNotFoundError:
+            exclude_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(exclude_path, "a") as f:
+            f.write(f"{pattern}\n")
 
+    def _delete_trash(self, task: CleanTask):
+        seen_inodes: set[tuple[int, int]] = set()
+        for trash_path in task.trash:
+            task.reclaimed += core.disk_usage(trash_path, seen_inodes)
+            shutil.rmtree(trash_path, ignore_errors=True)
+        if len(task.trash) > 0 and task.trash[0].parent.name == self.trash_name:
+            try:
+                task.trash[0].parent.rmdir()
+            except OSError:
+                pass
 
+        self.task_driver.finish(task)
+        remaining = [path for path in task.trash if path.exists()]
+        if len(remaining) > 0:
+            self._display_result(task, core.CommandResult.fail(f"Failed to delete {remaining[0].name}"))
+        else:
+            self._display_result(task, core.CommandResult.success(f"{core.format_bytes(task.reclaimed)} reclaimed"))
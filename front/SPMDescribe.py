@@ -0,0 +1,84 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+import json
+
+import core
+import front
+from .ManifestCache import ManifestCache
+
+class SPMDescribe:
+    parser: ArgumentParser
+    default_root_path: Path
+    logger: core.Logger
+    file_manager: core.FileManager | None
+
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
+        self.default_root_path = default_root_path
+        self.logger = logger
+        self.file_manager = file_manager
+        self.parser = parser or ArgumentParser(description="SwiftPM Describe")
+        self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
+        self.parser.add_argument("-n", "--name", type=str, help="The package name")
+        self.parser.add_argument("-p", "--parallel", type=int, default=8, help="Number of parallel dump-package processes on cache misses.")
+        self.parser.add_argument("--json", action="store_true", help="Print the manifests as JSON")
+
+    def run(self, args: Namespace):
+        root_path: Path = self.default_root_path if args.root is None else Path(args.root)
+        package_pathes = [p for p in front.SPMFind(root_path, file_manager=self.file_manager).find() if args.name is None or p.name == args.name]
+        manifests = ManifestCache(self.file_manager, max_workers=args.parallel or 8).load_many(package_pathes)
+
+        if args.json:
+            print(json.dumps({str(path.absolute()): manifest for path, manifest in zip(package_pathes, manifests) if isinstance(manifest, dict)}, indent=2))
+            return
+
+        for path, manifest in zip(package_pathes, manifests):
+            if isinstance(manifest, core.CommandResult):
+                self.logger.log(f"\033[0;31m✗\033[0m {path.absolute().name}{manifest.appendics_message()}")
+                continue
+
+            print(f"\033[1m{manifest.get('name', path.absolute().name)}\033[0m ({path.absolute()})")
+            products = [f"{product.get('name')} ({self._product_type(product)})" for product in manifest.get("products", [])]
+            print(f"  Products: {', '.join(products) if len(products) > 0 else '-'}")
+            dependencies = [self._format_dependency(dependency) for dependency in manifest.get("dependencies", [])]
+            print(f"  Dependencies: {', '.join(dependencies) if len(dependencies) > 0 else '-'}")
+
+    @staticmethod
+    def _product_type(product: dict) -> str:
+        product_type = product.get("type")
+        if isinstance(product_type, dict) and len(product_type) > 0:
+            return next(iter(product_type))
+        return str(product_type)
+
+    @staticmethod
+    def _format_dependency(dependency: dict) -> str:
+        # {"sourceControl": [{...}]}, {"fileSystem": [{...}]} or {"registry": [{...}]}; older toolchains use "scm" and "local"
+        if len(dependency) != 1:
+            return str(dependency.get("identity", dependency))
+        kind, values = next(iter(dependency.items()))
+        value = values[0] if isinstance(values, list) and len(values) > 0 else values
+        if not isinstance(value, dict):
+            return str(value)
+
+        identity = value.get("identity", "?")
+        if kind in ("fileSystem", "local"):
+            return f"{identity} ({value.get('path', '?')})"
+
+        location = value.get("location")
+        if isinstance(location, dict):
+            remote = location.get("remote") or location.get("local") or []
+            location = remote[0] if isinstance(remote, list) and len(remote) > 0 else remote
+            if isinstance(location, dict):
+                location = location.get("urlString", location)
+
+        details: list[str] = [str(location)] if location else []
+        requirement = value.get("requirement")
+        if isinstance(requirement, dict) and len(requirement) > 0:
+            requirement_kind, requirement_value = next(iter(requirement.items()))
+            requirement_value = requirement_value[0] if isinstance(requirement_value, list) and len(requirement_value) > 0 else requirement_value
+            if requirement_kind == "range" and isinstance(requirement_value, dict):
+                details.append(f"{requirement_value.get('lowerBound')}..<{requirement_value.get('upperBound')}")
+            elif requirement_kind == "exact":
+                details.append(f"=={requirement_value}")
+            else:
+                details.append(f"{requirement_kind} {requirement_value}")
+        return f"{identity} ({' '.join(details)})" if len(details) > 0 else identity
@@ -0,0 +1,58 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+import hashlib
+
+import core
+import front
+
+class SPMDiskUsage:
+    parser: ArgumentParser
+    default_root_path: Path
+    logger: core.Logger
+    file_manager: core.FileManager | None
+
+    artifact_directories = [".build", ".swiftpm"]
+
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
+        self.default_root_path = default_root_path
+        self.logger = logger
+        self.file_manager = file_manager
+        self.parser = parser or ArgumentParser(description="SwiftPM Disk Usage")
+        self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
+        self.parser.add_argument("-n", "--name", type=str, help="The package name")
+        self.parser.add_argument("-p", "--parallel", type=int, default=8, help="Number of parallel scanning threads.")
+        self.parser.add_argument("--rescan", action="store_true", help="Ignore the cache and list every directory again.")
+
+    def run(self, args: Namespace):
+        root_path: Path = self.default_root_path if args.root is None else Path(args.root)
+        package_pathes = [p for p in front.SPMFind(root_path, file_manager=self.file_manager).find() if args.name is None or p.name == args.name]
+
+        scanner = core.DiskUsageScanner(cache_path=self.cache_path(self.file_manager, root_path), max_workers=args.parallel or 8, use_cache=not args.rescan)
+        artifact_pathes = [package_path / name for package_path in package_pathes for name in self.artifact_directories]
+        sizes = scanner.scan(artifact_pathes)
+        scanner.save()
+
+        rows: list[tuple[str, list[int]]] = []
+        for i, package_path in enumerate(package_pathes):
+            package_sizes = sizes[i * len(self.artifact_directories):(i + 1) * len(self.artifact_directories)]
+            rows.append((package_path.absolute().name, package_sizes))
+        rows.sort(key=lambda row: sum(row[1]), reverse=True)
+
+        header = ["Total"] + self.artifact_directories
+        print("  ".join(f"{title:>10}" for title in header) + "  Package")
+        for name, package_sizes in rows:
+            if sum(package_sizes) == 0:
+                continue
+            columns = [sum(package_sizes)] + package_sizes
+            print("  ".join(f"{core.format_bytes(size):>10}" for size in columns) + f"  {name}")
+        print(f"{core.format_bytes(sum(sizes)):>10}  in {len(package_pathes)} packages")
+
+    @staticmethod
+    def cache_path(file_manager: core.FileManager | None, root_path: Path) -> Path | None:
+        """
+        The scan cache of a workspace, shared with the commands that measure build artifacts.
+        """
+        if file_manager is None:
+            return None
+        key = hashlib.sha1(str(root_path.absolute()).encode("utf-8")).hexdigest()
+        return file_manager.command_directory() / "du" / f"{key}.json"
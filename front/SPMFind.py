@@ -1,18 +1,131 @@
 from pathlib import Path
 from typing import Generator
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+
+import core
+
+@dataclass
+class DirectoryEntry:
+    mtime_ns: int
+    is_package: bool
+    children: list[str]
+    device: int = 0
+    inode: int = 0
 
 class SPMFind:
     root_path: Path
+    file_manager: core.FileManager | None
+    max_workers: int
+
+    index_version = 2
+    pruned_directories = {".build", ".git", ".swiftpm"}
 
-    def __init__(self, root_path: Path):
+    def __init__(self, root_path: Path, file_manager: core.FileManager | None = None, max_workers: int = 8):
         self.root_path = root_path
+        self.file_manager = file_manager
+        self.max_workers = max_workers
 
     def find(self) -> Generator[Path, None, None]:
         if (self.root_path / "Package.swift").exists():
             yield self.root_path
             return
 
-        for dir in self.root_path.iterdir():
-            if dir.is_dir() and (dir / "Package.swift").exists():
-                yield dir
-        
\ No newline at end of file
+        index = self._load_index()
+        new_index: dict[str, DirectoryEntry] = {}
+        packages: list[Path] = []
+
+        # symlinked directories are followed, so a directory reached twice (e.g. through a link to an ancestor) is skipped
+        visited: set[tuple[int, int]] = set()
+        frontier = [Path(".")]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(frontier) > 0:
+                entries = executor.map(lambda relpath: self._scan_directory(relpath, index.get(str(relpath))), frontier)
+                next_frontier: list[Path] = []
+                for relpath, entry in zip(frontier, entries):
+                    if entry is None or (entry.device, entry.inode) in visited:
+                        continue
+                    visited.add((entry.device, entry.inode))
+                    new_index[str(relpath)] = entry
+                    if entry.is_package:
+                        packages.append(self.root_path / relpath)
+                    else:
+                        next_frontier.extend(relpath / child for child in entry.children)
+                frontier = next_frontier
+
+        if new_index != index:
+            self._save_index(new_index)
+
+        yield from sorted(packages)
+
+    def _scan_directory(self, relpath: Path, cached: DirectoryEntry | None) -> DirectoryEntry | None:
+        path = self.root_path / relpath
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        # A directory's mtime changes whenever an entry is added, removed or renamed in it,
+        # so an unchanged mtime means the cached listing is still valid.
+        # The inode tells a symlink pointed at another directory apart.
+        if cached is not None and (cached.mtime_ns, cached.device, cached.inode) == (stat.st_mtime_ns, stat.st_dev, stat.st_ino):
+            return cached
+
+        is_package = False
+        children: list[str] = []
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    if entry.name == "Package.swift":
+                        is_package = True
+                    elif entry.name not in self.pruned_directories and entry.is_dir():
+                        children.append(entry.name)
+        except OSError:
+            return None
+
+        if is_package:
+            children = []
+
+        return DirectoryEntry(mtime_ns=stat.st_mtime_ns, is_package=is_package, children=sorted(children), device=stat.st_dev, inode=stat.st_ino)
+
+    def _index_path(self) -> Path | None:
+        if self.file_manager is None:
+            return None
+        key = hashlib.sha1(str(self.root_path.absolute()).encode("utf-8")).hexdigest()
+        return self.file_manager.command_directory() / "find" / f"{key}.json"
+
+    def _load_index(self) -> dict[str, DirectoryEntry]:
+        index_path = self._index_path()
+        if index_path is None or not index_path.exists():
+            return {}
+
+        try:
+            with open(index_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != self.index_version:
+                return {}
+            return {relpath: DirectoryEntry(**entry) for relpath, entry in data["directories"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _save_index(self, index: dict[str, DirectoryEntry]):
+        index_path = self._index_path()
+        if index_path is None:
+            return
+
+        data = {
+            "version": self.index_version,
+            "root": str(self.root_path.absolute()),
+            "directories": {relpath: asdict(entry) for relpath, entry in index.items()},
+        }
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
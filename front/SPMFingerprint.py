@@ -0,0 +1,43 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+import json
+
+import core
+import front
+
+class SPMFingerprint:
+    parser: ArgumentParser
+    default_root_path: Path
+    logger: core.Logger
+    file_manager: core.FileManager | None
+
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
+        self.default_root_path = default_root_path
+        self.logger = logger
+        self.file_manager = file_manager
+        self.parser = parser or ArgumentParser(description="SwiftPM Fingerprint")
+        self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
+        self.parser.add_argument("-n", "--name", type=str, help="The package name")
+        self.parser.add_argument("--json", action="store_true", help="Print the fingerprints as JSON")
+
+    def run(self, args: Namespace):
+        root_path: Path = self.default_root_path if args.root is None else Path(args.root)
+        package_pathes = [p for p in front.SPMFind(root_path, file_manager=self.file_manager).find() if args.name is None or p.name == args.name]
+
+        tree_fingerprint = self.tree_fingerprint(self.file_manager)
+        fingerprints = tree_fingerprint.fingerprint_many(package_pathes)
+        tree_fingerprint.save()
+
+        if args.json:
+            print(json.dumps({str(path.absolute()): fingerprint for path, fingerprint in zip(package_pathes, fingerprints)}, indent=2))
+            return
+        for path, fingerprint in zip(package_pathes, fingerprints):
+            print(f"{fingerprint}  {path.absolute().name}")
+
+    @staticmethod
+    def tree_fingerprint(file_manager: core.FileManager | None) -> core.TreeFingerprint:
+        """
+        The fingerprinting engine shared by the commands, with its stat cache in the command directory.
+        """
+        cache_path = file_manager.command_directory() / "fingerprint" / "stat_cache.json" if file_manager is not None else None
+        return core.TreeFingerprint(cache_path=cache_path)
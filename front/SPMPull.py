@@ -1,11 +1,10 @@
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
-import threading
+import asyncio
 from dataclasses import dataclass
 
 import core
 import front
-import time
 import git
 
 @dataclass
@@ -14,88 +13,139 @@ class PullTask:
     force_pull: bool
     auto_fix_upstream_origin: bool
     printer: core.SingleLinePrinter
+    stage: str = "Fetching"
     finished = False
 
     @property
     def name(self):
         return self.path.absolute().name
     
-    def print(self, message: str):
-        self.printer.print(message)
+    def print(self, message: str, status: core.LineStatus | None = None):
+        self.printer.print(message, status)
 
 class SPMPull:
     parser: ArgumentParser
     default_root_path: Path
     logger: core.Logger
+    file_manager: core.FileManager | None
 
+    # network-bound fetches and the cheap local stage run on separate pools
+    fetch_executor: core.ParallaxExecutor
     parallax_executor: core.ParallaxExecutor
+    task_driver: core.TaskDriver
 
-    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None) -> None:
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
         self.default_root_path = default_root_path
         self.logger = logger
+        self.file_manager = file_manager
+        self.fetch_executor = core.ParallaxExecutor()
         self.parallax_executor = core.ParallaxExecutor()
         self.parser = parser or ArgumentParser(description="SwiftPM Pull")
         self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
         self.parser.add_argument("--force", action="store_true", help="Force pull even if there is a conflict.")
         self.parser.add_argument("--autofix", action="store_true", help="Automatically fix upstream origin.")
-        self.parser.add_argument("-p", "--parallel", type=int, default=4, help="Number of parallel processes.")
+        self.parser.add_argument("-p", "--parallel", type=core.parallel_argument, default=4, help="Number of parallel processes, or auto.")
+        self.parser.add_argument("--fetch-parallel", type=core.parallel_argument, default=16, help="Number of parallel fetches, or auto.")
+        self.parser.add_argument("--async", dest="use_async", action="store_true", help="Run git on an asyncio event loop instead of worker threads.")
+        self.parser.add_argument("--inflight", type=int, default=64, help="Maximum number of git processes in flight with --async.")
         
     def run(self, args: Namespace):
         root_path: Path = self.default_root_path if args.root is None else Path(args.root)
         force_pull = args.force or False
         auto_fix_upstream_origin = args.autofix or True
-        parallel_count = args.parallel or 4
-        self.parallax_executor.max_parallel = parallel_count
+        concurrency = core.AdaptiveConcurrency.apply(self.parallax_executor, args.parallel or 4, "io")
+        fetch_concurrency = core.AdaptiveConcurrency.apply(self.fetch_executor, args.fetch_parallel or 16, "network")
         
-        package_pathes = list(front.SPMFind(root_path).find())
+        package_pathes = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
         printer = core.MultilinePrinter(len(package_pathes), disable_input=True, command_name=self.logger.command_name)
 
+        self.task_driver = core.TaskDriver(
+            self.parallax_executor,
+            durations=core.DurationStore.of_command(self.file_manager, "pull"),
+            duration_key=lambda task: str(task.path.absolute())
+        )
         tasks: list[PullTask] = []
         for i, package_path in enumerate(package_pathes):
             task = PullTask(path=package_path, force_pull=force_pull, auto_fix_upstream_origin=auto_fix_upstream_origin, printer=printer.printer(i))
             tasks.append(task)
-            self.parallax_executor.register(self._run_task, task)
+            task.print(f"Waiting: {task.name}")
+
+        if not args.use_async:
+            self.task_driver.register_all(self._run_fetch, tasks, spinner=self._spin, executor=self.fetch_executor, finish_on_return=False)
+        else:
+            engine = core.AsyncProcessEngine(max_concurrency=args.inflight)
+            self.task_driver.track(self.fetch_executor.register(lambda tasks: asyncio.run(self._run_tasks_async(tasks, engine)), tasks))
     
-        # rotate spinner
-        spinner = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        spinner_index = 0
-        
-        while True:
-            for i, task in enumerate(tasks):
-                if task.finished: continue
-                index = (spinner_index + i) % len(spinner)
-                task.print(f"{spinner[index]} Pulling: {task.name}...")
-            
-            spinner_index = spinner_index + 1
-            time.sleep(0.1)
-
-            if all([task.finished for task in tasks]):
-                break
-
-        self.parallax_executor.join()
+        self.task_driver.wait()
+        concurrency.stop()
+        fetch_concurrency.stop()
         printer.terminate()
 
-    def _run_task(self, task: PullTask):
-        def display_result(result: core.CommandResult):
-            if result.type == "success":
-                task.print(f"\033[0m\033[0;32m✓\033[0m Pull: {task.name}{result.appendics_message()}")
-            elif result.type == "fail":
-                task.print(f"\033[0;31m✗\033[0m Pull failed: {task.name}{result.appendics_message()}")
-            elif result.type == "ignorable":
-                task.print(f"Nothing to pull: {task.name}")
+    def _spin(self, task: PullTask, frame: str):
+        task.print(f"{frame} {task.stage}: {task.name}...", "running")
 
+    def _run_fetch(self, task: PullTask):
         pull = git.GitPull(task.path)
-        can_pull = pull.can_pull()
-        if can_pull is None:
-            task.finished = True
+        result = self._check(pull)
+        if result is None:
+            result = pull.fetch()
+        if result.type != "fail":
+            result = pull.needs_integration()
+
+        if result is not None:
+            self.task_driver.finish(task)
+            self._display_result(task, result)
             return
-        if can_pull.type != "success":
-            task.finished = True
-            display_result(can_pull)
+
+        task.stage = "Merging"
+        self.task_driver.register(self._run_integrate, task, spinner=self._spin)
+
+    def _run_integrate(self, task: PullTask):
+        result = git.GitPull(task.path).integrate(task.force_pull, task.auto_fix_upstream_origin)
+        self.task_driver.finish(task)
+        self._display_result(task, result)
+
+    async def _run_tasks_async(self, tasks: list[PullTask], engine: core.AsyncProcessEngine):
+        # coroutines reach the engine's semaphore in this order, so the slowest go first
+        tasks = sorted(tasks, key=lambda task: -self.task_driver.expected_duration(task))
+        await asyncio.gather(*[self._run_task_async(task, engine) for task in tasks])
+
+    async def _run_task_async(self, task: PullTask, engine: core.AsyncProcessEngine):
+        self.task_driver.start(task, self._spin)
+        pull = git.GitPull(task.path)
+        try:
+            result = self._check(pull)
+            if result is None:
+                result = await pull.fetch_async(engine)
+            if result.type != "fail":
+                result = pull.needs_integration()
+        except Exception as e:
+            result = core.CommandResult.fail(str(e))
+
+        if result is not None:
+            self.task_driver.finish(task)
+            self._display_result(task, result)
             return
-                
-        result = pull.run(task.force_pull, task.auto_fix_upstream_origin)
-        task.finished = True
-        display_result(result)
+
+        task.stage = "Merging"
+        try:
+            await asyncio.wrap_future(self.task_driver.register(self._run_integrate, task, spinner=self._spin))
+        except Exception:
+            # the driver already marked the task finished
+            pass
+
+    def _check(self, pull: git.GitPull) -> core.CommandResult | None:
+        can_pull = pull.can_pull()
+        if can_pull is not None and can_pull.type != "success":
+            return can_pull
+        return None
+
+    def _display_result(self, task: PullTask, result: core.CommandResult):
+        if result.type == "success":
+            task.print(f"\033[0m\033[0;32m✓\033[0m Pull: {task.name}{result.appendics_message()}", result.type)
+        elif result.type == "fail":
+            task.print(f"\033[0;31m✗\033[0m Pull failed: {task.name}{result.appendics_message()}", result.type)
+        elif result.type == "ignorable":
+            task.print(f"Nothing to pull: {task.name}", result.type)
 
 
@@ -1,8 +1,12 @@
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 from dataclasses import dataclass
-import time
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import datetime
+import time
+import json
+import os
 
 import core
 import git
@@ -14,6 +18,10 @@ class CommitTask:
     force: bool
     printer: core.SingleLinePrinter
     is_daemon: bool
+    status: git.StatusSummary | None = None
+    tags_fingerprint: list[int] | None = None
+    push_tags: bool = True
+    tags_pushed: bool = False
     tag_printer: core.SingleLinePrinter | None = None
     finished = False
 
@@ -21,52 +29,120 @@ class CommitTask:
     def name(self):
         return self.path.absolute().name
     
-    def print(self, message: str):
+    def print(self, message: str, status: core.LineStatus | None = None):
         if self.is_daemon:
             print(core.remove_escape_sequences(message))
         else:
-            self.printer.print(message)
+            self.printer.print(message, status)
 
-    def print_tag(self, message: str):
+    def print_tag(self, message: str, status: core.LineStatus | None = None):
         if self.is_daemon:
             print(core.remove_escape_sequences(message))
         else:
             if self.tag_printer is None:
                 self.tag_printer = self.printer.subprinter()
 
-            self.tag_printer.print(message)
+            self.tag_printer.print(message, status)
 
 class SPMPush:
     parser: ArgumentParser
     logger: core.Logger
+    file_manager: core.FileManager | None
     default_root_path: Path
     parallax_executor: core.ParallaxExecutor
+    task_driver: core.TaskDriver
+
+    # git writes these when a branch is committed to or a tag is created, outside the working tree
+    watched_git_directories = [".git/refs/heads", ".git/refs/tags"]
+    # how often the daemon looks for packages cloned or created after it started
+    rediscovery_interval = 30.0
 
-    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None) -> None:
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
         self.logger = logger
+        self.file_manager = file_manager
         self.default_root_path = default_root_path
         self.parallax_executor = core.ParallaxExecutor()
         self.parser = parser or ArgumentParser(description="SwiftPM Commit")
         self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
         self.parser.add_argument("-f", "--force", action="store_true", help="Force pull even if there is a conflict.")
-        self.parser.add_argument("-p", "--parallel", type=int, default=4, help="Number of parallel processes.")
-        self.parser.add_argument("--daemon", action="store_true", help="Run as daemon.")
+        self.parser.add_argument("-p", "--parallel", type=core.parallel_argument, default=4, help="Number of parallel processes, or auto.")
+        self.parser.add_argument("--daemon", action="store_true", help="Keep running, and commit and push the packages whose trees change.")
+        self.parser.add_argument("--debounce", type=core.duration_argument, default=5.0, help="With --daemon, how long a package has to stay unchanged before it is pushed (e.g. 5s, 1m).")
+        self.parser.add_argument("--poll", type=core.duration_argument, help="With --daemon, compare stat snapshots at this interval instead of using inotify.")
+        self.parser.add_argument("--async", dest="use_async", action="store_true", help="Run git on an asyncio event loop instead of worker threads.")
+        self.parser.add_argument("--inflight", type=int, default=64, help="Maximum number of git processes in flight with --async.")
+        self.parser.add_argument("--no-skip", action="store_true", help="Run commit and push for every package, even if its working tree is clean.")
 
     def run(self, args: Namespace):
         root_path: Path = self.default_root_path if args.root is None else Path(args.root)
-        parallel_count = args.parallel or 4
+        package_pathes = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
+
+        if not args.daemon:
+            self._push(package_pathes, args)
+            return
+
+        # watching starts before the first round, so edits made during it aren't missed
+        watcher = core.TreeWatcher(
+            package_pathes,
+            watched_subdirectories=self.watched_git_directories,
+            poll_interval=args.poll or 2.0,
+            use_inotify=args.poll is None
+        )
+        try:
+            # the first round pushes whatever changed while no daemon was running
+            self._push(package_pathes, args)
+            self.logger.log(f"Watching {len(package_pathes)} packages ({watcher.mode})")
+            rediscover_at = time.monotonic() + self.rediscovery_interval
+            while True:
+                changed = watcher.wait(args.debounce, timeout=max(0.0, rediscover_at - time.monotonic()))
+                # a package removed since the last discovery is still watched, but not pushed
+                changed = [package_path for package_path in changed if package_path in package_pathes]
+                if len(changed) > 0:
+                    # the cached HEAD, config and refs of a package are stale once its .git changed
+                    for package_path in changed:
+                        git.GitMetadata.invalidate(package_path)
+                    self._push(changed, args)
+
+                if time.monotonic() >= rediscover_at:
+                    found = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
+                    added = [package_path for package_path in found if package_path not in package_pathes]
+                    package_pathes = found
+                    if len(added) > 0:
+                        for package_path in added:
+                            git.GitMetadata.invalidate(package_path)
+                        watcher.add_roots(added)
+                        self.logger.log(f"Watching {len(added)} new packages")
+                        self._push(added, args)
+                    rediscover_at = time.monotonic() + self.rediscovery_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+    def _push(self, package_pathes: list[Path], args: Namespace):
+        parallel_count: int | str = args.parallel or 4
         force_push = args.force or False
         is_daemon = args.daemon or False
 
         if is_daemon:
             parallel_count = 1
 
-        self.parallax_executor.max_parallel = parallel_count
-        
-        package_pathes = list(front.SPMFind(root_path).find())
+        concurrency = core.AdaptiveConcurrency.apply(self.parallax_executor, parallel_count, "network")
+
+        # cheap local pre-pass: one `git status` per package, no network
+        statuses: list[git.StatusSummary | None] = [None] * len(package_pathes)
+        if not args.no_skip:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                statuses = list(executor.map(self._status, package_pathes))
+        pushed_tags = self._load_pushed_tags()
         
         printer = core.MultilinePrinter(len(package_pathes), disable_input=not is_daemon, command_name=self.logger.command_name)
         
+        self.task_driver = core.TaskDriver(
+            self.parallax_executor,
+            durations=core.DurationStore.of_command(self.file_manager, "push"),
+            duration_key=lambda task: str(task.path.absolute())
+        )
         tasks: list[CommitTask] = []
 
         if is_daemon:
@@ -74,51 +150,132 @@ class SPMPush:
             print(date)
 
         for i, package_path in enumerate(package_pathes):
-            task = CommitTask(path=package_path, force=force_push, printer=printer.printer(i), is_daemon=is_daemon)
+            task = CommitTask(path=package_path, force=force_push, printer=printer.printer(i), is_daemon=is_daemon, status=statuses[i])
+            task.tags_fingerprint = git.GitPush(package_path).tags_fingerprint()
+            task.push_tags = args.no_skip or task.tags_fingerprint is None or pushed_tags.get(str(package_path.absolute())) != task.tags_fingerprint
+            if task.status is not None and not task.status.dirty and not task.status.needs_push and not task.push_tags:
+                task.finished = True
+                task.print(f"No changes: {task.name}", "ignorable")
+                continue
+
             tasks.append(task)
-            self.parallax_executor.register(self._run_task, task)
+            if not is_daemon:
+                task.print(f"Waiting: {task.name}")
 
-        # rotate spinner
-        spinner = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        spinner_index = 0
-        
-        while True:
-            if is_daemon: break
-            for i, task in enumerate(tasks):
-                if task.finished: continue
-                index = (spinner_index + i) % len(spinner)
-                task.print(f"{spinner[index]} Pushing: {task.name}...")
-            
-            spinner_index = spinner_index + 1
-            time.sleep(0.1)
-
-            if all([task.finished for task in tasks]):
-                break
-
-        self.parallax_executor.join()
+        if not args.use_async:
+            self.task_driver.register_all(self._run_task, tasks, spinner=None if is_daemon else self._spin)
+        else:
+            engine = core.AsyncProcessEngine(max_concurrency=args.inflight)
+            self.task_driver.track(self.parallax_executor.register(lambda tasks: asyncio.run(self._run_tasks_async(tasks, engine, is_daemon)), tasks))
+
+        self.task_driver.wait()
+        concurrency.stop()
         if printer is not None:
             printer.terminate()
 
+        for task in tasks:
+            if task.tags_pushed and task.tags_fingerprint is not None:
+                pushed_tags[str(task.path.absolute())] = task.tags_fingerprint
+        self._save_pushed_tags(pushed_tags)
+
+    def _status(self, package_path: Path) -> git.StatusSummary | None:
+        summary = git.GitStatus(package_path).summary()
+        if isinstance(summary, core.CommandResult):
+            # let the regular commit and push report the problem
+            return None
+        return summary
+
+    def _pushed_tags_path(self) -> Path | None:
+        if self.file_manager is None:
+            return None
+        return self.file_manager.command_directory() / "push" / "tags.json"
+
+    def _load_pushed_tags(self) -> dict[str, list[int]]:
+        path = self._pushed_tags_path()
+        if path is None or not path.exists():
+            return {}
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_pushed_tags(self, pushed_tags: dict[str, list[int]]):
+        path = self._pushed_tags_path()
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(pushed_tags, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _spin(self, task: CommitTask, frame: str):
+        task.print(f"{frame} Pushing: {task.name}...", "running")
+
     def _run_task(self, task: CommitTask):
         commiter = git.GitCommit(task.path)
         pusher = git.GitPush(task.path)
 
-        if commiter.commit():
-            task.finished = True
-            task.print(f"\033[0;32m✓\033[0m Commit: {task.name}")
-            result = pusher.push(task.force)
-            if result.type == "success":
-                task.print(f"\033[0;32m✓\033[0m Push: {task.name}{result.appendics_message()}")
-            elif result.type == "fail":
-                task.print(f"\033[0;31m✗\033[0m Push failed: {task.name}{result.appendics_message()}")
-        else:
-            task.finished = True
-            task.print(f"No changes: {task.name}")
+        committed = (task.status is None or task.status.dirty) and commiter.commit()
+        push_branch = self._display_commit_result(task, committed)
+
+        if push_branch or task.push_tags:
+            branch_result, tags_result = pusher.push_refs(task.force, branch=push_branch, tags=task.push_tags)
+            self._display_push_refs_result(task, push_branch, branch_result, tags_result)
+
+    async def _run_tasks_async(self, tasks: list[CommitTask], engine: core.AsyncProcessEngine, is_daemon: bool):
+        # coroutines reach the engine's semaphore in this order, so the slowest go first
+        tasks = sorted(tasks, key=lambda task: -self.task_driver.expected_duration(task))
+        await asyncio.gather(*[self._run_task_async(task, engine, is_daemon) for task in tasks])
+
+    async def _run_task_async(self, task: CommitTask, engine: core.AsyncProcessEngine, is_daemon: bool):
+        if not is_daemon:
+            self.task_driver.start(task, self._spin)
+        commiter = git.GitCommit(task.path)
+        pusher = git.GitPush(task.path)
 
-        result = pusher.push_tags()
+        try:
+            committed = (task.status is None or task.status.dirty) and await commiter.commit_async(engine)
+            push_branch = self._display_commit_result(task, committed)
 
+            if push_branch or task.push_tags:
+                branch_result, tags_result = await pusher.push_refs_async(engine, task.force, branch=push_branch, tags=task.push_tags)
+                self._display_push_refs_result(task, push_branch, branch_result, tags_result)
+        except Exception as e:
+            self.task_driver.finish(task, failed=True)
+            task.print(f"\033[0;31m✗\033[0m Push failed: {task.name}: {str(e) or type(e).__name__}", "fail")
+
+    def _display_commit_result(self, task: CommitTask, committed: bool) -> bool:
+        """
+        Print the commit line and return whether the branch needs to be pushed.
+        """
+        self.task_driver.finish(task)
+        if committed:
+            task.print(f"\033[0;32m✓\033[0m Commit: {task.name}", "success")
+            return True
+
+        task.print(f"No changes: {task.name}", "ignorable")
+        return task.status is not None and task.status.needs_push
+
+    def _display_push_refs_result(self, task: CommitTask, push_branch: bool, branch_result: core.CommandResult, tags_result: core.CommandResult):
+        if push_branch:
+            self._display_push_result(task, branch_result)
+        if task.push_tags:
+            self._display_push_tags_result(task, tags_result)
+
+    def _display_push_result(self, task: CommitTask, result: core.CommandResult):
         if result.type == "success":
-            task.print_tag(f"      └ \033[0;32m✓\033[0m Push tags: {task.name}{result.appendics_message()}")
+            task.print(f"\033[0;32m✓\033[0m Push: {task.name}{result.appendics_message()}", result.type)
         elif result.type == "fail":
-            task.print_tag(f"      └ \033[0;31m✗\033[0m Push tags failed: {task.name}{result.appendics_message()}")
+            task.print(f"\033[0;31m✗\033[0m Push failed: {task.name}{result.appendics_message()}", result.type)
 
+    def _display_push_tags_result(self, task: CommitTask, result: core.CommandResult):
+        task.tags_pushed = result.type != "fail"
+        if result.type == "success":
+            task.print_tag(f"      └ \033[0;32m✓\033[0m Push tags: {task.name}{result.appendics_message()}")
+        elif result.type == "fail":
+            task.print_tag(f"      └ \033[0;31m✗\033[0m Push tags failed: {task.name}{result.appendics_message()}", result.type)
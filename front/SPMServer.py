@@ -0,0 +1,133 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Callable
+import json
+import os
+import socketserver
+import threading
+
+import core
+import spm_client
+from .ServerWorkspace import ServerWorkspace
+from .TestCache import TestCache
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    respond: Callable[[dict], dict]
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: _UnixServer
+
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        response = self.server.respond(message) if isinstance(message, dict) else {"fallback": True}
+        try:
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+        except OSError:
+            pass
+
+class SPMServer:
+    """
+    Keeps the package index, git status and test fingerprints of the workspaces warm, and answers
+    `spm status` and cached `spm test` over a Unix socket in the command directory (see spm_client).
+    """
+    parser: ArgumentParser
+    default_root_path: Path
+    logger: core.Logger
+    file_manager: core.FileManager | None
+
+    _server: _UnixServer | None
+    _test_cache: TestCache | None
+    _workspaces: dict[str, ServerWorkspace]
+    _use_inotify: bool
+    _lock: threading.Lock
+
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
+        self.default_root_path = default_root_path
+        self.logger = logger
+        self.file_manager = file_manager
+        self._server = None
+        self._test_cache = None
+        self._workspaces = {}
+        self._use_inotify = True
+        self._lock = threading.Lock()
+        self.parser = parser or ArgumentParser(description="SwiftPM Server")
+        self.parser.add_argument("--stop", action="store_true", help="Stop the running server.")
+        self.parser.add_argument("--poll", action="store_true", help="Compare stat snapshots instead of using inotify to notice changes.")
+
+    def run(self, args: Namespace):
+        if self.file_manager is None:
+            self.logger.error("The server needs a command directory.")
+            return
+        command_directory = self.file_manager.command_directory()
+
+        if args.stop:
+            response = spm_client.request(command_directory, {"command": "stop"})
+            self.logger.log("Server stopped" if response is not None else "No server is running")
+            return
+        if spm_client.request(command_directory, {"command": "ping"}) is not None:
+            self.logger.log("A server is already running")
+            return
+
+        self._use_inotify = not args.poll
+        self._test_cache = TestCache(self.file_manager)
+        socket_path = spm_client.socket_path(command_directory)
+        # a socket left by a server that didn't exit cleanly refuses connections
+        socket_path.unlink(missing_ok=True)
+        # created with 0600 right away, so other users can't connect between bind() and a chmod()
+        umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(str(socket_path), _RequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.respond = self._respond
+
+        self.logger.log(f"Listening on {socket_path}")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            socket_path.unlink(missing_ok=True)
+            for workspace in self._workspaces.values():
+                workspace.close()
+            # only the stat cache: the passes belong to the `spm test` runs that record them
+            self._test_cache.tree_fingerprint.save()
+
+    def _respond(self, message: dict) -> dict:
+        if message.get("version") != spm_client.protocol_version:
+            return {"fallback": True}
+
+        command = message.get("command")
+        if command == "ping":
+            return {"returncode": 0, "lines": []}
+        if command == "stop":
+            assert self._server is not None
+            # shutdown() waits for serve_forever(), which waits for this request
+            threading.Thread(target=self._server.shutdown).start()
+            return {"returncode": 0, "lines": []}
+
+        try:
+            workspace = self._workspace(Path(message["root"]))
+            if command == "status":
+                return {"returncode": 0, "lines": workspace.status_lines()}
+            if command == "test":
+                lines = workspace.test_lines(message.get("name"))
+                if lines is None:
+                    return {"fallback": True}
+                return {"returncode": 0, "lines": lines + [f"\033[0;34m[{self.logger.command_name}]\033[0m \033[0;32m✓\033[0m All tests passed"]}
+        except Exception as e:
+            self.logger.exeception(e)
+        return {"fallback": True}
+
+    def _workspace(self, root_path: Path) -> ServerWorkspace:
+        assert self.file_manager is not None and self._test_cache is not None
+        key = str(root_path.absolute())
+        with self._lock:
+            if key not in self._workspaces:
+                self._workspaces[key] = ServerWorkspace(root_path, self.file_manager, self._test_cache, use_inotify=self._use_inotify)
+            return self._workspaces[key]
@@ -0,0 +1,51 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import core
+import git
+import front
+
+class SPMStatus:
+    parser: ArgumentParser
+    default_root_path: Path
+    logger: core.Logger
+    file_manager: core.FileManager | None
+
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
+        self.default_root_path = default_root_path
+        self.logger = logger
+        self.file_manager = file_manager
+        self.parser = parser or ArgumentParser(description="SwiftPM Status")
+        self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
+
+    def run(self, args: Namespace):
+        root_path: Path = self.default_root_path if args.root is None else Path(args.root)
+        package_pathes = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            summaries = list(executor.map(lambda package_path: git.GitStatus(package_path).summary(), package_pathes))
+        for package_path, summary in zip(package_pathes, summaries):
+            print(self.status_line(package_path, summary))
+
+    @staticmethod
+    def status_line(package_path: Path, summary: git.StatusSummary | core.CommandResult) -> str:
+        name = package_path.absolute().name
+        if isinstance(summary, core.CommandResult):
+            return f"\033[0;31m✗\033[0m {name}{summary.appendics_message()}"
+
+        metadata = git.GitMetadata.load(package_path)
+        branch = metadata.current_branch if metadata is not None else None
+        details: list[str] = []
+        if summary.dirty:
+            details.append("changes")
+        if summary.ahead > 0:
+            details.append(f"ahead {summary.ahead}")
+        if summary.behind > 0:
+            details.append(f"behind {summary.behind}")
+        if not summary.has_upstream:
+            details.append("no upstream")
+
+        if len(details) == 0:
+            return f"\033[0;32m✓\033[0m {name}: {branch or '(detached)'}"
+        return f"\033[0;33m●\033[0m {name}: {branch or '(detached)'} ({', '.join(details)})"
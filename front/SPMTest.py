@@ -2,11 +2,13 @@ from dataclasses import dataclass, field
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 import subprocess
-import re
-import time
+import os
 
 import core
 import front
+from .SwiftTestParser import SwiftTestParser, SwiftTestHandler
+from .TestCache import TestCache
+from .PackageManifest import PackageManifest
 
 class SwiftTest:
     pass
@@ -28,6 +30,7 @@ class TestTask:
     package_path: Path
     printer: core.SingleLinePrinter
     index: int
+    fingerprint: str | None = None
     
     state: str = "Waiting"
     spinner_index: int = 0
@@ -63,7 +66,7 @@ class TestTask:
         if self.finished: return
 
         index = (self.index + self.spinner_index) % len(spinner_string)
-        self.printer.print(f"{spinner_string[index]} {self.name}: {self.state}")
+        self.printer.print(f"{spinner_string[index]} {self.name}: {self.state}", "waiting" if self.state == "Waiting" else "running")
         self.spinner_index += 1
 
         if self.current_test is not None:
@@ -97,22 +100,31 @@ class TestTask:
                 )
 
 
-    def finish(self):
+    def finish(self, successed: bool = True):
         for test in self.executed_tests:
             if not test.finished:
                 test.finished = True
                 test.failed_count = 0
                 test.test_count = 0
             
-        successed = all([test.successed for test in self.executed_tests])
+        successed = successed and all([test.successed for test in self.executed_tests])
         if successed:
-            self.printer.print(f"\033[0;32m✓\033[0m {self.name}: {self.state}")
+            self.printer.print(f"\033[0;32m✓\033[0m {self.name}: {self.state}", "success")
         else:
-            self.printer.print(f"\033[0;31m✗\033[0m {self.name}: {self.state}")
+            self.printer.print(f"\033[0;31m✗\033[0m {self.name}: {self.state}", "fail")
         
         self.successed = successed
         self.finished = True
 
+    def finish_cached(self):
+        self.state = "Cached"
+        self.printer.print(f"\033[0;32m✓\033[0m {self.name}: {self.state}", "ignorable")
+        self.successed = True
+        self.finished = True
+
+    def print(self, message: str, status: core.LineStatus | None = None):
+        self.printer.print(message, status)
+
     def print_state(self, state: str):
         self.state = state
         self.rotate_state_spinner()
@@ -125,55 +137,143 @@ class TestTask:
         self.test_state_table[test_index] = state
         self.rotate_state_spinner()
 
+    def find_test(self, name: str) -> Test | None:
+        if self.current_test is not None and self.current_test.name == name:
+            return self.current_test
+        for test in reversed(self.executed_tests):
+            if test.name == name:
+                return test
+        return None
+
+class TestTaskHandler(SwiftTestHandler):
+    task: TestTask
+    run_test_count: int
+    run_failed_count: int
+
+    def __init__(self, task: TestTask) -> None:
+        self.task = task
+        self.run_test_count = 0
+        self.run_failed_count = 0
+
+    def building(self) -> None:
+        self.task.print_state("Building")
+
+    def build_complete(self) -> None:
+        self.task.print_state("Build complete")
+
+    def tests_started(self) -> None:
+        self.task.print_state("Testing")
+
+    def suite_started(self, name: str) -> None:
+        self.task.print_state("Testing")
+        if self.task.current_test is not None:
+            # swift-testing runs suites in parallel; the previous one is finished by name later
+            self.task.conclude_test()
+        self.task.new_test(name=name)
+        self.task.print_teststate("Testing")
+
+    def suite_finished(self, name: str, passed: bool, test_count: int | None, failed_count: int | None) -> None:
+        test = self.task.find_test(name)
+        if test is None:
+            return
 
-ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+        test.finished = True
+        test.successed = passed
+        test.test_count = test_count
+        test.failed_count = failed_count
 
-def remove_escape_sequences(line: str) -> str:
-    line = ansi_escape.sub('', line)
-    return line
+        if test_count is None:
+            state = "\033[0;32mPassed\033[0m" if passed else "\033[0;31mFailed\033[0m"
+        elif passed:
+            state = f"\033[0;32mPassed {test_count} tests\033[0m"
+        else:
+            state = f"\033[0;31mFailed {failed_count}/{test_count} tests\033[0m"
+
+        if test is self.task.current_test:
+            self.task.print_teststate(state)
+            self.task.conclude_test()
+        else:
+            self.task.test_state_table[test.index] = state
+
+    def run_finished(self, test_count: int, failed_count: int) -> None:
+        self.run_test_count += test_count
+        self.run_failed_count += failed_count
 
 class SPMTest: 
     logger: core.Logger
+    file_manager: core.FileManager | None
     parser: ArgumentParser
     default_root_path: Path
     parallax_executor: core.ParallaxExecutor
+    task_driver: core.TaskDriver
+    memory_admission: core.MemoryAdmission
 
-    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None) -> None:
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
         self.logger = logger
+        self.file_manager = file_manager
         self.default_root_path = default_root_path
         self.parallax_executor = core.ParallaxExecutor()
         self.parser = parser or ArgumentParser(description="SwiftPM Test")
         self.parser.add_argument("root", nargs="?", help="The packages root directory", type=str)
         self.parser.add_argument("-n", "--name", help="The package name", type=str)
-        self.parser.add_argument("-p", "--parallel", type=int, help="Run tests in parallel (default: 1)")
+        self.parser.add_argument("-p", "--parallel", type=core.parallel_argument, help="Run tests in parallel, a number or auto (default: 1)")
+        self.parser.add_argument("--no-cache", action="store_true", help="Run the tests even if the package didn't change since it last passed")
+        self.parser.add_argument("--min-free-memory", type=int, default=1024, help="Don't start another package while less than this many MB of memory would be left (default: 1024).")
         
     def run(self, args: Namespace) -> None:
         root_path = self.default_root_path if args.root is None else Path(args.root)
         package_name = args.name
-        parallel = args.parallel or 1
-        self.parallax_executor.max_parallel = parallel
+        concurrency = core.AdaptiveConcurrency.apply(self.parallax_executor, args.parallel or 1, "cpu")
+        self.memory_admission = core.MemoryAdmission(
+            headroom=args.min_free_memory * 1024 * 1024,
+            peaks=core.MemoryPeakStore.of_command(self.file_manager, "test"),
+            peak_key=lambda task: str(task.package_path.absolute())
+        )
+        self.parallax_executor.admission = self.memory_admission
 
-        package_pathes = [p for p in front.SPMFind(root_path).find() if p.is_dir() and (package_name is None or p.name == package_name)]
+        package_pathes = [p for p in front.SPMFind(root_path, file_manager=self.file_manager).find() if p.is_dir() and (package_name is None or p.name == package_name)]
         printer = core.MultilinePrinter(len(package_pathes), command_name=self.logger.command_name)
         # printer.enabled = False
+        self.task_driver = core.TaskDriver(
+            self.parallax_executor,
+            durations=core.DurationStore.of_command(self.file_manager, "test"),
+            duration_key=lambda task: str(task.package_path.absolute())
+        )
         tasks: list[TestTask] = []
 
+        # --no-cache still records the passes of this run
+        test_cache = TestCache(self.file_manager) if self.file_manager is not None else None
+        fingerprints: list[str | None] = [None] * len(package_pathes)
+        if test_cache is not None:
+            fingerprints = list(test_cache.fingerprints(package_pathes))
+
+        pending_tasks: dict[Path, TestTask] = {}
         for i, package_path in enumerate(package_pathes):
-            task = TestTask(package_path=package_path, printer=printer.printer(i), index=i)
-            task.print_state("Waiting")
+            task = TestTask(package_path=package_path, printer=printer.printer(i), index=i, fingerprint=fingerprints[i])
             tasks.append(task)
-            self.parallax_executor.register(self._run_task, task)
+            if test_cache is not None and not args.no_cache and task.fingerprint is not None and test_cache.is_passed(package_path, task.fingerprint):
+                task.finish_cached()
+                continue
+            task.print_state("Waiting")
+            pending_tasks[package_path.resolve()] = task
 
-        while True:
-            for task in tasks:
-                task.rotate_state_spinner()
-            if all([task.finished for task in tasks]):
-                break
-            time.sleep(0.1)
+        # dependencies are built and tested before the packages that use them
+        graph = PackageManifest.dependency_graph(list(pending_tasks.keys()))
+        self.task_driver.register_graph(self._run_task, graph, pending_tasks, spinner=lambda task, _: task.rotate_state_spinner())
 
-        self.parallax_executor.join()
+        self.task_driver.wait()
+        concurrency.stop()
+        self.memory_admission.save()
         printer.terminate()
 
+        if test_cache is not None:
+            for task in tasks:
+                if task.state != "Cached":
+                    test_cache.record_run(task.package_path)
+                if task.successed and task.fingerprint is not None:
+                    test_cache.record_pass(task.package_path, task.fingerprint)
+            test_cache.save()
+
         successed = all([task.successed for task in tasks])
 
         if successed:
@@ -185,91 +285,40 @@ class SPMTest:
             
     def _run_task(self, task: TestTask):
         process = subprocess.Popen(
-            ["stdbuf", "-oL", "swift", "test"],
+            ["swift", "test"],
             cwd=task.package_path, 
             stdout=subprocess.PIPE, 
-            stderr=subprocess.STDOUT
+            stderr=subprocess.STDOUT,
+            env={**os.environ, "NSUnbufferedIO": "YES"}
         )
 
         if process.stdout is None: return
-
-        while True:
-            line = process.stdout.readline()
-            line = line.decode("utf-8").strip()
-            line = remove_escape_sequences(line)
-
-            self._process_line(task, line)
-
-            if process.poll() is not None: break
-
-        successed = all([test.successed for test in task.executed_tests])
-        test_count = sum([test.test_count or 0 for test in task.executed_tests])
-        failed_count = sum([test.failed_count or 0 for test in task.executed_tests])
-
-        if successed:
+        self.memory_admission.track(process.pid, task)
+
+        handler = TestTaskHandler(task)
+        parser = SwiftTestParser(handler)
+        fd = process.stdout.fileno()
+        try:
+            # read until EOF so nothing buffered after the process exits is lost
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk: break
+                parser.feed(chunk)
+            parser.close()
+            process.stdout.close()
+            returncode = process.wait()
+        finally:
+            self.memory_admission.untrack(process.pid)
+
+        successed = all([test.successed for test in task.executed_tests]) and returncode == 0
+        test_count = sum([test.test_count or 0 for test in task.executed_tests]) + handler.run_test_count
+        failed_count = sum([test.failed_count or 0 for test in task.executed_tests]) + handler.run_failed_count
+
+        if successed and failed_count == 0:
             task.print_state(f"\033[0;32mPassed {test_count} tests\033[0m")
+        elif failed_count == 0:
+            task.print_state(f"\033[0;31mFailed with exit code {returncode}\033[0m")
         else:
             task.print_state(f"\033[0;31mFailed {failed_count}/{test_count} tests\033[0m")
 
-        task.finish()
-
-
-    def _process_line(self, task: TestTask, line: str):
-        if line == "": return
-
-        if line.startswith("Building"):
-            task.print_state(f"Building")
-            return
-
-        if line.startswith("Build complete"):
-            task.print_state(f"Build complete")
-            return
-
-        match = re.match(r"Test Suite '(.*)' started", line)
-        if match:
-            task.print_state(f"Testing")
-            testname = match.group(1)
-            if testname.endswith(".xctest") or testname == "All tests":
-                return
-            self._test_started(task, match.group(1))
-            return
-            
-        match = re.match(r"Test Suite '(.*)' passed", line)
-        if match and task.current_test:
-            task.current_test.finished = True
-            task.current_test.successed = True
-            return
-
-        match = re.match(r"Test Suite '(.*)' failed", line)
-        if match and task.current_test:
-            task.current_test.finished = True
-            task.current_test.successed = False
-            return
-        
-        match = re.match(r"Executed (\d+) tests?, with (\d+) failures?", line)
-        if match and task.current_test:
-            test_count = int(match.group(1))
-            failed_count = int(match.group(2))
-            self._test_finished(task, test_count, failed_count)
-
-    def _test_started(self, task: TestTask, name: str) -> None:
-        test = task.new_test(name=name)
-        task.current_test = test
-        task.print_teststate(f"Testing")
-
-    def _test_finished(self, task: TestTask, test_count: int, failed_count: int) -> None:
-        test = task.current_test  
-        if not test: 
-            raise Exception("No test is running")
-        if not test.finished:
-            raise Exception("Test is not finished")
-        
-        test.failed_count = failed_count
-        test.test_count = test_count
-
-        if test.successed:
-            task.print_teststate(f"\033[0;32mPased {test_count} tests\033[0m")
-        else:
-            task.print_teststate(f"\033[0;31mFailed {failed_count}/{test_count} tests\033[0m")
-
-        task.conclude_test()
+        self.task_driver.finish(task, lambda: task.finish(successed and failed_count == 0))
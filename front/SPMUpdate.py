@@ -1,78 +1,168 @@
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
+import shutil
+import json
+import os
 from dataclasses import dataclass
 
 import core
 import front
-import time
 import git
+from .UpdateState import UpdateState
+from .PackageManifest import PackageManifest
 
 @dataclass
 class UpdateTask:
     package_path: Path
     printer: core.SingleLinePrinter
     finished = False
+    resolve_only: bool = False
 
     @property
     def name(self):
         return self.package_path.absolute().name
     
-    def print(self, message: str):
-        self.printer.print(message)
+    def print(self, message: str, status: core.LineStatus | None = None):
+        self.printer.print(message, status)
 
 class SPMUpdate:
     parser: ArgumentParser
     default_root_path: Path
     logger: core.Logger
-    parallax_executor = core.ParallaxExecutor()
+    file_manager: core.FileManager | None
+    parallax_executor: core.ParallaxExecutor
+    task_driver: core.TaskDriver
+    memory_admission: core.MemoryAdmission
+    update_state: UpdateState
+    config_path: Path | None
 
-    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None) -> None:
+    def __init__(self, default_root_path: Path, logger: core.Logger, parser: ArgumentParser | None = None, file_manager: core.FileManager | None = None) -> None:
         self.default_root_path = default_root_path
         self.logger = logger
+        self.file_manager = file_manager
+        self.parallax_executor = core.ParallaxExecutor()
         self.parser = parser or ArgumentParser(description="SwiftPM Update")
         self.parser.add_argument("root", nargs="?", type=str, help="Root path of Swift packages")
-        self.parser.add_argument("-p", "--parallel", type=int, default=4, help="Number of parallel processes.")
+        self.parser.add_argument("-p", "--parallel", type=core.parallel_argument, default=4, help="Number of parallel processes, or auto.")
+        self.parser.add_argument("--min-free-memory", type=int, default=1024, help="Don't start another package while less than this many MB of memory would be left (default: 1024).")
+        self.parser.add_argument("--fresh", type=core.duration_argument, help="Skip packages updated within this time (e.g. 24h) whose Package.swift and Package.resolved haven't changed since.")
+        self.parser.add_argument("--force", action="store_true", help="Update every package, even fresh ones (overrides --fresh, e.g. in an alias).")
+        self.parser.add_argument("--resolve", action="store_true", help="Only resolve the pins of Package.resolved, and only in packages where some are not checked out.")
+        self.parser.add_argument("--mirror", action="store_true", help="Fetch every remote dependency of the workspace once into a shared mirror and resolve all packages from it.")
         
     def run(self, args: Namespace):
         root_path: Path = self.default_root_path if args.root is None else Path(args.root)
-        parallel_count = args.parallel or 4
-        self.parallax_executor.max_parallel = parallel_count
+        concurrency = core.AdaptiveConcurrency.apply(self.parallax_executor, args.parallel or 4, "network")
+        self.memory_admission = core.MemoryAdmission(
+            headroom=args.min_free_memory * 1024 * 1024,
+            peaks=core.MemoryPeakStore.of_command(self.file_manager, "update"),
+            peak_key=lambda task: str(task.package_path.absolute())
+        )
+        self.parallax_executor.admission = self.memory_admission
         
-        package_pathes = list(front.SPMFind(root_path).find())
-        printer = core.MultilinePrinter(len(package_pathes), disable_input=True, command_name=self.logger.command_name)
+        package_pathes = list(front.SPMFind(root_path, file_manager=self.file_manager).find())
+
+        self.update_state = UpdateState(self.file_manager)
+        skipped: dict[Path, str] = {}
+        for package_path in package_pathes:
+            if args.resolve and len(UpdateState.missing_pins(package_path)) == 0:
+                skipped[package_path] = "All pins checked out"
+            elif not args.resolve and not args.force and args.fresh is not None and self.update_state.is_fresh(package_path, args.fresh):
+                skipped[package_path] = "Up to date"
 
+        self.config_path = None
+        if args.mirror:
+            self.config_path = self._sync_mirrors([package_path for package_path in package_pathes if package_path not in skipped])
+
+        printer = core.MultilinePrinter(len(package_pathes), disable_input=True, command_name=self.logger.command_name)
+        self.task_driver = core.TaskDriver(
+            self.parallax_executor,
+            durations=core.DurationStore.of_command(self.file_manager, "update"),
+            duration_key=lambda task: str(task.package_path.absolute())
+        )
         tasks: list[UpdateTask] = []
         for i, package_path in enumerate(package_pathes):
-            task = UpdateTask(package_path=package_path, printer=printer.printer(i))
+            task = UpdateTask(package_path=package_path, printer=printer.printer(i), resolve_only=args.resolve)
+            if package_path in skipped:
+                task.finished = True
+                task.print(f"{skipped[package_path]}: {task.name}", "ignorable")
+                continue
             tasks.append(task)
-            self.parallax_executor.register(self._run_task, task)
+            task.print(f"Waiting: {task.name}")
+        self.task_driver.register_all(self._run_task, tasks, spinner=self._spin)
     
-        # rotate spinner
-        spinner = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
-        spinner_index = 0
-        
-        while True:
-            for i, task in enumerate(tasks):
-                if task.finished: continue
-                index = (spinner_index + i) % len(spinner)
-                task.print(f"{spinner[index]} Updating: {task.name}...")
-            
-            spinner_index = spinner_index + 1
-            time.sleep(0.1)
+        self.task_driver.wait()
+        concurrency.stop()
+        self.memory_admission.save()
+        self.update_state.save()
+        printer.terminate()
 
-            if all([task.finished for task in tasks]):
-                break
+        fresh_count = len([reason for reason in skipped.values() if reason == "Up to date"])
+        if fresh_count > 0:
+            self.logger.log(f"Skipped {fresh_count} fresh packages (use --force to update them)")
 
-        self.parallax_executor.join()
-        printer.terminate()
+    def _sync_mirrors(self, package_pathes: list[Path]) -> Path | None:
+        """
+        Clone or fetch each remote dependency of the packages once, and write a SwiftPM configuration directory that maps them to the mirrors.
+        """
+        if self.file_manager is None:
+            self.logger.log("\033[0;31m✗\033[0m --mirror needs a command directory; resolving from the original remotes.")
+            return None
+
+        mirror_directory = self.file_manager.command_directory() / "mirrors"
+        urls = list(dict.fromkeys(url for package_path in package_pathes for url in PackageManifest(package_path).remote_urls()))
+        if len(urls) == 0:
+            return None
+
+        self.logger.log(f"Syncing {len(urls)} mirrors...")
+        git_mirrors = [git.GitMirror(url, mirror_directory) for url in urls]
+        with ThreadPoolExecutor(max_workers=self.parallax_executor.max_parallel) as executor:
+            results = list(executor.map(lambda git_mirror: git_mirror.sync(), git_mirrors))
+
+        mirrors: list[dict[str, str]] = []
+        for git_mirror, result in zip(git_mirrors, results):
+            if result.type == "fail":
+                self.logger.log(f"\033[0;31m✗\033[0m Mirror failed: {git_mirror.url}{result.appendics_message()}")
+                continue
+            mirrors.append({"mirror": git_mirror.mirror_url, "original": git_mirror.url})
+
+        # passed with --config-path, so nothing is written into the packages themselves
+        config_path = mirror_directory / "configuration"
+        try:
+            config_path.mkdir(parents=True, exist_ok=True)
+            user_registries = Path.home() / ".swiftpm" / "configuration" / "registries.json"
+            if user_registries.exists():
+                shutil.copyfile(user_registries, config_path / "registries.json")
+            tmp_path = config_path / f"mirrors.json.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"object": mirrors, "version": 1}, f, indent=2)
+            os.replace(tmp_path, config_path / "mirrors.json")
+        except OSError as e:
+            self.logger.log(f"\033[0;31m✗\033[0m Failed to write the mirror configuration: {e}")
+            return None
+        return config_path
+
+    def _spin(self, task: UpdateTask, frame: str):
+        task.print(f"{frame} {'Resolving' if task.resolve_only else 'Updating'}: {task.name}...", "running")
 
     def _run_task(self, task: UpdateTask):
-        result = subprocess.run(["swift", "package", "update"], cwd=task.package_path, capture_output=True, text=True)
+        command = "resolve" if task.resolve_only else "update"
+        arguments = ["swift", "package", command]
+        if self.config_path is not None:
+            arguments += ["--config-path", str(self.config_path)]
+        process = subprocess.Popen(arguments, cwd=task.package_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.memory_admission.track(process.pid, task)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            self.memory_admission.untrack(process.pid)
+        result = subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
 
-        task.finished = True
+        self.task_driver.finish(task)
         if not result.returncode == 0:
-            error_message = f"Update failed with return code {result.returncode}."
+            error_message = f"{command.capitalize()} failed with return code {result.returncode}."
             sub_message: str | None = None
             for row in result.stderr.split("\n"):
                 if row.startswith("error: "):
@@ -82,10 +172,13 @@ class SPMUpdate:
             if sub_message is not None:
                 error_message += f"\n      └ \033[0;31m{sub_message}\033[0m"
 
-            task.print(f"\033[0;31m✗\033[0m Update failed: {task.name}: {error_message}")
+            task.print(f"\033[0;31m✗\033[0m {command.capitalize()} failed: {task.name}: {error_message}", "fail")
         
+        elif task.resolve_only:
+            task.print(f"\033[0m\033[0;32m✓\033[0m Resolved: {task.name}", "success")
         else:
-            task.print(f"\033[0m\033[0;32m✓\033[0m Updated: {task.name}")
+            self.update_state.record_update(task.package_path)
+            task.print(f"\033[0m\033[0;32m✓\033[0m Updated: {task.name}", "success")
     
 
 
@@ -0,0 +1,113 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import core
+import git
+from .SPMFind import SPMFind
+from .SPMStatus import SPMStatus
+from .TestCache import TestCache
+
+class ServerWorkspace:
+    """
+    The warm state `spm server` keeps for one root: its packages, their git status and their test fingerprints.
+    Entries of a package are dropped as soon as its tree changes.
+    """
+    # besides the working tree, commits, fetches and new tags change the status
+    watched_git_directories = [".git/refs"]
+
+    root_path: Path
+    file_manager: core.FileManager
+    test_cache: TestCache
+    use_inotify: bool
+
+    _package_pathes: list[Path]
+    _statuses: dict[Path, tuple[str | None, git.StatusSummary | core.CommandResult]]
+    _watcher_stop: threading.Event | None
+    _lock: threading.Lock
+
+    def __init__(self, root_path: Path, file_manager: core.FileManager, test_cache: TestCache, use_inotify: bool = True) -> None:
+        self.root_path = root_path
+        self.file_manager = file_manager
+        self.test_cache = test_cache
+        self.use_inotify = use_inotify
+        self._package_pathes = []
+        self._statuses = {}
+        self._watcher_stop = None
+        self._lock = threading.Lock()
+
+    def packages(self) -> list[Path]:
+        # the persistent index of SPMFind costs one stat per directory, so the package set is checked on every request
+        package_pathes = list(SPMFind(self.root_path, file_manager=self.file_manager).find())
+        with self._lock:
+            if package_pathes != self._package_pathes:
+                self._package_pathes = package_pathes
+                self._statuses.clear()
+                self._watch(package_pathes)
+                # changes made while no watcher was running went unnoticed
+                for package_path in package_pathes:
+                    self.test_cache.invalidate(package_path)
+        return package_pathes
+
+    def status_lines(self) -> list[str]:
+        package_pathes = self.packages()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            summaries = list(executor.map(self._status, package_pathes))
+        return [SPMStatus.status_line(package_path, summary) for package_path, summary in zip(package_pathes, summaries)]
+
+    def test_lines(self, name: str | None) -> list[str] | None:
+        """
+        The output of `spm test` if every package passed at its current fingerprint, or None if some have to run.
+        """
+        package_pathes = [p for p in self.packages() if p.is_dir() and (name is None or p.name == name)]
+        fingerprints = self.test_cache.fingerprints(package_pathes)
+        self.test_cache.reload()
+        if not all(self.test_cache.is_passed(package_path, fingerprint) for package_path, fingerprint in zip(package_pathes, fingerprints)):
+            return None
+        return [f"\033[0;32m✓\033[0m {package_path.absolute().name}: Cached" for package_path in package_pathes]
+
+    def close(self):
+        with self._lock:
+            if self._watcher_stop is not None:
+                self._watcher_stop.set()
+                self._watcher_stop = None
+
+    def _status(self, package_path: Path) -> git.StatusSummary | core.CommandResult:
+        # switching between branches at the same commit only rewrites HEAD, which isn't watched
+        metadata = git.GitMetadata.load(package_path)
+        head = metadata.head if metadata is not None else None
+        with self._lock:
+            cached = self._statuses.get(package_path)
+        if cached is not None and cached[0] == head:
+            return cached[1]
+
+        summary = git.GitStatus(package_path).summary()
+        with self._lock:
+            if package_path in self._package_pathes:
+                self._statuses[package_path] = (head, summary)
+        return summary
+
+    def _invalidate(self, package_path: Path):
+        with self._lock:
+            self._statuses.pop(package_path, None)
+        git.GitMetadata.invalidate(package_path)
+        self.test_cache.invalidate(package_path)
+
+    def _watch(self, package_pathes: list[Path]):
+        if self._watcher_stop is not None:
+            self._watcher_stop.set()
+        stop = threading.Event()
+        self._watcher_stop = stop
+        watcher = core.TreeWatcher(package_pathes, watched_subdirectories=self.watched_git_directories, use_inotify=self.use_inotify)
+
+        def watch():
+            try:
+                while not stop.is_set():
+                    for package_path in watcher.wait(0, timeout=1.0):
+                        self._invalidate(package_path)
+            finally:
+                watcher.close()
+
+        thread = threading.Thread(target=watch)
+        thread.daemon = True
+        thread.start()
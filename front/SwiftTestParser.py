@@ -0,0 +1,130 @@
+import re
+
+import core
+
+class SwiftTestHandler:
+    """
+    Receives the events of SwiftTestParser. Override only what you need.
+    Counts are None when the output format doesn't report them (swift-testing suites).
+    """
+    def building(self) -> None:
+        pass
+
+    def build_complete(self) -> None:
+        pass
+
+    def tests_started(self) -> None:
+        pass
+
+    def suite_started(self, name: str) -> None:
+        pass
+
+    def suite_finished(self, name: str, passed: bool, test_count: int | None, failed_count: int | None) -> None:
+        pass
+
+    def run_finished(self, test_count: int, failed_count: int) -> None:
+        pass
+
+class SwiftTestParser:
+    """
+    Incremental parser of `swift test` output for both XCTest and swift-testing.
+    Feed it raw chunks as they arrive; every complete line is classified by one compiled regex and dispatched once.
+    """
+    _line_pattern = re.compile(
+        r"(?P<building>Building )"
+        r"|(?P<build_complete>Build complete!?)"
+        r"|Test Suite '(?P<xc_suite>.*)' (?P<xc_suite_state>started|passed|failed)"
+        r"|\s*Executed (?P<xc_executed>\d+) tests?, with (?P<xc_failures>\d+) failures?"
+        r"|\S+\s+Suite (?P<st_suite>.+?) (?P<st_suite_state>started\.|passed after|failed after)"
+        r"|\S+\s+Test run with (?P<st_run>\d+) tests? (?:passed|failed)"
+        r"|\S+\s+(?P<st_run_started>Test run started)"
+        r"|\S+\s+Test (?P<st_test>.+?) (?P<st_test_state>passed after|failed after)"
+    )
+    # cheap first-character filter; the swift-testing symbols are not ASCII
+    _interesting_ascii = frozenset("BTE\t ")
+
+    handler: SwiftTestHandler
+
+    _buffer: bytes
+    _xc_finished_suite: tuple[str, bool] | None
+    _st_failed: int
+
+    def __init__(self, handler: SwiftTestHandler) -> None:
+        self.handler = handler
+        self._buffer = b""
+        self._xc_finished_suite = None
+        self._st_failed = 0
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._buffer + chunk
+        lines = data.split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._process_line(line)
+
+    def close(self) -> None:
+        """
+        Flush the last line if the output didn't end with a newline.
+        """
+        if len(self._buffer) > 0:
+            self._process_line(self._buffer)
+            self._buffer = b""
+
+    def _process_line(self, raw_line: bytes) -> None:
+        if len(raw_line) == 0:
+            return
+        first = raw_line[0]
+        if first < 0x80 and chr(first) not in self._interesting_ascii and first != 0x1B and first != 0x0D:
+            return
+
+        line = raw_line.decode("utf-8", errors="replace")
+        if "\r" in line:
+            # progress output overwrites itself; only the last state counts
+            line = line.rstrip("\r").rpartition("\r")[2]
+        if "\x1b" in line:
+            line = core.remove_escape_sequences(line)
+        line = line.strip()
+
+        match = self._line_pattern.match(line)
+        if match is None:
+            return
+        self._dispatch(match)
+
+    def _dispatch(self, match: re.Match[str]) -> None:
+        kind = match.lastgroup
+        if kind == "building":
+            self.handler.building()
+        elif kind == "build_complete":
+            self.handler.build_complete()
+        elif kind == "xc_suite_state":
+            name = match.group("xc_suite")
+            state = match.group("xc_suite_state")
+            if name.endswith(".xctest") or name in ("All tests", "Selected tests", "Debug tests"):
+                self._xc_finished_suite = None
+                if state == "started":
+                    self.handler.tests_started()
+                return
+            if state == "started":
+                self.handler.suite_started(name)
+            else:
+                # the counts follow on the next "Executed" line
+                self._xc_finished_suite = (name, state == "passed")
+        elif kind == "xc_failures":
+            if self._xc_finished_suite is not None:
+                name, passed = self._xc_finished_suite
+                self._xc_finished_suite = None
+                self.handler.suite_finished(name, passed, int(match.group("xc_executed")), int(match.group("xc_failures")))
+        elif kind == "st_suite_state":
+            name = match.group("st_suite").strip('"')
+            state = match.group("st_suite_state")
+            if state == "started.":
+                self.handler.suite_started(name)
+            else:
+                self.handler.suite_finished(name, state == "passed after", None, None)
+        elif kind == "st_test_state":
+            if match.group("st_test_state") == "failed after":
+                self._st_failed += 1
+        elif kind == "st_run_started":
+            self.handler.tests_started()
+        elif kind == "st_run":
+            self.handler.run_finished(int(match.group("st_run")), self._st_failed)
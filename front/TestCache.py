@@ -0,0 +1,136 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+import core
+from .PackageManifest import PackageManifest
+from .SPMFingerprint import SPMFingerprint
+
+class TestCache:
+    """
+    Remembers the fingerprints of packages whose tests passed, and when each package was last tested.
+    A fingerprint covers the package tree (see core.TreeFingerprint) and the fingerprints of its local dependencies.
+    Only the trees of the packages passed to fingerprints() are kept between calls, until they are invalidated;
+    dependencies may live outside the watched workspace, so their part is computed again on every call.
+    """
+    cache_version = 1
+
+    file_manager: core.FileManager
+    tree_fingerprint: core.TreeFingerprint
+
+    _passed: dict[str, str]
+    _last_runs: dict[str, float]
+    _trees: dict[Path, str]
+    _generation: int
+    _lock: threading.Lock
+
+    def __init__(self, file_manager: core.FileManager) -> None:
+        self.file_manager = file_manager
+        self.tree_fingerprint = SPMFingerprint.tree_fingerprint(file_manager)
+        data = self._load(file_manager)
+        self._passed = dict(data.get("passed", {}))
+        self._last_runs = dict(data.get("last_runs", {}))
+        self._trees = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def is_passed(self, package_path: Path, fingerprint: str) -> bool:
+        return self._passed.get(str(package_path.absolute())) == fingerprint
+
+    def record_pass(self, package_path: Path, fingerprint: str):
+        self._passed[str(package_path.absolute())] = fingerprint
+
+    def record_run(self, package_path: Path):
+        self._last_runs[str(package_path.absolute())] = time.time()
+
+    @classmethod
+    def last_runs(cls, file_manager: core.FileManager) -> dict[str, float]:
+        """
+        When `spm test` last built each package, by absolute path.
+        """
+        return dict(cls._load(file_manager).get("last_runs", {}))
+
+    def fingerprints(self, package_pathes: list[Path]) -> list[str]:
+        keys = [path.resolve() for path in package_pathes]
+        with self._lock:
+            generation = self._generation
+            missing = [key for key in keys if key not in self._trees]
+        if len(missing) > 0:
+            trees = self.tree_fingerprint.fingerprint_many(missing)
+            with self._lock:
+                # a tree invalidated while it was hashed may be outdated already
+                if generation == self._generation:
+                    self._trees.update(zip(missing, trees))
+        memo: dict[Path, str] = {}
+        return [self.fingerprint(key, memo=memo) for key in keys]
+
+    def fingerprint(self, package_path: Path, visiting: frozenset[Path] = frozenset(), memo: dict[Path, str] | None = None) -> str:
+        key = package_path.resolve()
+        if memo is not None and key in memo:
+            return memo[key]
+        with self._lock:
+            tree = self._trees.get(key)
+        if tree is None:
+            tree = self.tree_fingerprint.fingerprint(key)
+
+        digest = hashlib.sha256()
+        digest.update(tree.encode("utf-8"))
+        for dependency in PackageManifest(key).local_dependencies():
+            if dependency in visiting or dependency == key:
+                continue
+            digest.update(f"dependency {dependency}\0{self.fingerprint(dependency, visiting | {key}, memo)}\0".encode("utf-8"))
+
+        fingerprint = digest.hexdigest()
+        if memo is not None:
+            memo[key] = fingerprint
+        return fingerprint
+
+    def invalidate(self, package_path: Path):
+        """
+        Forget the tree of a package that changed.
+        """
+        with self._lock:
+            self._generation += 1
+            self._trees.pop(package_path.resolve(), None)
+
+    def reload(self):
+        """
+        Read the passes and runs recorded by other processes since this cache was created.
+        """
+        data = self._load(self.file_manager)
+        self._passed = dict(data.get("passed", {}))
+        self._last_runs = dict(data.get("last_runs", {}))
+
+    def save(self):
+        self.tree_fingerprint.save()
+        path = self._cache_path(self.file_manager)
+        data = {"version": self.cache_version, "passed": self._passed, "last_runs": self._last_runs}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _cache_path(file_manager: core.FileManager) -> Path:
+        return file_manager.command_directory() / "test" / "passed.json"
+
+    @classmethod
+    def _load(cls, file_manager: core.FileManager) -> dict:
+        path = cls._cache_path(file_manager)
+        if not path.exists():
+            return {}
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get("version") != cls.cache_version:
+                return {}
+            return data
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
@@ -0,0 +1,103 @@
+from pathlib import Path
+import json
+import os
+import threading
+import time
+
+import core
+from .ManifestCache import ManifestCache
+from .PackageManifest import PackageManifest
+
+class UpdateState:
+    """
+    When each package was last updated, and the hash of its manifests and Package.resolved right after that update.
+    """
+    state_version = 1
+
+    file_manager: core.FileManager | None
+
+    _updates: dict[str, dict]
+    _lock: threading.Lock
+
+    def __init__(self, file_manager: core.FileManager | None) -> None:
+        self.file_manager = file_manager
+        self._updates = self._load()
+        self._lock = threading.Lock()
+
+    def is_fresh(self, package_path: Path, window: float) -> bool:
+        """
+        Whether the package was updated within the window and its resolution inputs haven't changed since.
+        """
+        with self._lock:
+            update = self._updates.get(str(package_path.absolute()))
+        if update is None or time.time() - update.get("updated_at", 0) > window:
+            return False
+        return update.get("key") == ManifestCache.manifest_key(package_path)
+
+    def record_update(self, package_path: Path):
+        key = ManifestCache.manifest_key(package_path)
+        if key is None:
+            return
+        with self._lock:
+            self._updates[str(package_path.absolute())] = {"key": key, "updated_at": time.time()}
+
+    @staticmethod
+    def missing_pins(package_path: Path) -> list[str]:
+        """
+        Identities of the pins in Package.resolved that aren't checked out at their pinned revision in .build.
+        Without a Package.resolved, that is the file itself if the package has remote dependencies.
+        """
+        manifest = PackageManifest(package_path)
+        if not (package_path / "Package.resolved").exists():
+            return ["Package.resolved"] if manifest.has_remote_dependencies() else []
+        pinned = {identity: revision for identity, (_, revision) in manifest.resolved_pins().items()}
+
+        try:
+            with open(package_path / ".build" / "workspace-state.json", "r") as f:
+                workspace_state = json.load(f)
+        except (OSError, ValueError):
+            return sorted(pinned.keys())
+
+        checked_out: dict[str, str | None] = {}
+        for dependency in workspace_state.get("object", {}).get("dependencies", []):
+            identity = dependency.get("packageRef", {}).get("identity")
+            state = dependency.get("state", {})
+            subpath = dependency.get("subpath")
+            if identity is None or subpath is None or not (package_path / ".build" / "checkouts" / subpath).exists():
+                continue
+            checked_out[identity] = state.get("checkoutState", {}).get("revision")
+
+        return sorted(identity for identity, revision in pinned.items() if identity not in checked_out or checked_out[identity] != revision)
+
+    def save(self):
+        path = self._state_path()
+        if path is None:
+            return
+        with self._lock:
+            data = {"version": self.state_version, "updates": self._updates}
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+    def _state_path(self) -> Path | None:
+        if self.file_manager is None:
+            return None
+        return self.file_manager.command_directory() / "update" / "state.json"
+
+    def _load(self) -> dict[str, dict]:
+        path = self._state_path()
+        if path is None or not path.exists():
+            return {}
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get("version") != self.state_version:
+                return {}
+            return dict(data["updates"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
@@ -3,4 +3,9 @@ from .SPMPull import SPMPull
 from .SPMFind import SPMFind
 from .SPMTest import SPMTest
 from .SPMClean import SPMClean
-from .SPMUpdate import SPMUpdate
\ No newline at end of file
+from .SPMUpdate import SPMUpdate
+from .SPMFingerprint import SPMFingerprint
+from .SPMDescribe import SPMDescribe
+from .SPMDiskUsage import SPMDiskUsage
+from .SPMStatus import SPMStatus
+from .SPMServer import SPMServer
\ No newline at end of file
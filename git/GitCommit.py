@@ -1,7 +1,9 @@
 import datetime
-import subprocess
 from pathlib import Path
 
+import core
+from .GitRunner import GitRunner, GitSteps
+
 class GitCommit:
     def __init__(self, package_path: Path) -> None:
         assert package_path.is_dir(), "Package path is not directory."
@@ -9,12 +11,18 @@ class GitCommit:
         self.package_path = package_path
 
     def commit(self) -> bool:
-        _ = subprocess.run(["git", "add", "."], cwd=self.package_path, capture_output=True, text=True)
+        return GitRunner.run(self.package_path, self._commit_steps())
+
+    async def commit_async(self, engine: core.AsyncProcessEngine) -> bool:
+        return await GitRunner.run_async(self.package_path, self._commit_steps(), engine)
+
+    def _commit_steps(self) -> GitSteps[bool]:
+        _ = yield ["git", "add", "."]
         # date
         commit_message = datetime.datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        result = subprocess.run(["git", "commit", "-m", commit_message], cwd=self.package_path, capture_output=True, text=True)
+        result = yield ["git", "commit", "-m", commit_message]
 
         if "nothing to commit" in result.stdout:
             return False
 
-        return True
\ No newline at end of file
+        return True
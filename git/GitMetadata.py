@@ -0,0 +1,261 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+@dataclass
+class GitRemote:
+    name: str
+    urls: list[str] = field(default_factory=list)
+    fetch: list[str] = field(default_factory=list)
+
+@dataclass
+class GitUpstream:
+    remote: str
+    merge: str
+
+    @property
+    def branch(self) -> str:
+        return self.merge.removeprefix("refs/heads/")
+
+    @property
+    def tracking_ref(self) -> str:
+        return f"refs/remotes/{self.remote}/{self.branch}"
+
+class GitConfig:
+    """
+    Minimal reader of the git config file format. Section and key names are case-insensitive, subsection names are not.
+    """
+    _section_pattern = re.compile(r'^\[\s*([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+    _entry_pattern = re.compile(r'^([A-Za-z][A-Za-z0-9-]*)\s*(?:=\s*(.*))?$')
+
+    values: dict[str, dict[str, list[str]]]
+
+    def __init__(self, text: str) -> None:
+        self.values = {}
+        section: dict[str, list[str]] | None = None
+        for raw_line in text.split("\n"):
+            line = raw_line.strip()
+            if line == "" or line[0] in "#;":
+                continue
+
+            match = self._section_pattern.match(line)
+            if match:
+                name = match.group(1).lower()
+                if match.group(2) is not None:
+                    name += "." + re.sub(r'\\(.)', r'\1', match.group(2))
+                section = self.values.setdefault(name, {})
+                line = line[match.end():].strip()
+                if line == "" or line[0] in "#;":
+                    continue
+
+            if section is None:
+                continue
+            match = self._entry_pattern.match(line)
+            if not match:
+                continue
+            value = "true" if match.group(2) is None else self._parse_value(match.group(2))
+            section.setdefault(match.group(1).lower(), []).append(value)
+
+    def get(self, section: str, key: str) -> str | None:
+        values = self.get_all(section, key)
+        return values[-1] if len(values) > 0 else None
+
+    def get_all(self, section: str, key: str) -> list[str]:
+        return self.values.get(section, {}).get(key.lower(), [])
+
+    def subsections(self, section: str) -> list[str]:
+        prefix = section.lower() + "."
+        return [name[len(prefix):] for name in self.values if name.startswith(prefix)]
+
+    @staticmethod
+    def _parse_value(value: str) -> str:
+        result = ""
+        in_quote = False
+        i = 0
+        while i < len(value):
+            char = value[i]
+            if char == '"':
+                in_quote = not in_quote
+            elif char == "\\" and i + 1 < len(value):
+                i += 1
+                result += {"n": "\n", "t": "\t"}.get(value[i], value[i])
+            elif char in "#;" and not in_quote:
+                break
+            else:
+                result += char
+            i += 1
+        return result.strip()
+
+class GitMetadata:
+    """
+    Reads HEAD, refs, remotes and upstream configuration straight from the .git directory.
+    Instances are cached per package for the whole run; call invalidate() after running a git command that changes them.
+    """
+    package_path: Path
+    git_dir: Path
+    common_dir: Path
+    config: GitConfig
+
+    _cache: dict[Path, "GitMetadata | None"] = {}
+    _cache_lock = threading.Lock()
+
+    _packed_refs: dict[str, str] | None
+
+    def __init__(self, package_path: Path, git_dir: Path, common_dir: Path) -> None:
+        self.package_path = package_path
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self._packed_refs = None
+        try:
+            with open(common_dir / "config", "r") as f:
+                self.config = GitConfig(f.read())
+        except OSError:
+            self.config = GitConfig("")
+
+    @classmethod
+    def load(cls, package_path: Path) -> "GitMetadata | None":
+        key = package_path.absolute()
+        with cls._cache_lock:
+            if key in cls._cache:
+                return cls._cache[key]
+
+        metadata = cls._read(key)
+        with cls._cache_lock:
+            cls._cache[key] = metadata
+        return metadata
+
+    @classmethod
+    def invalidate(cls, package_path: Path):
+        with cls._cache_lock:
+            cls._cache.pop(package_path.absolute(), None)
+
+    @classmethod
+    def _read(cls, package_path: Path) -> "GitMetadata | None":
+        git_dir = package_path / ".git"
+        if git_dir.is_file():
+            # worktrees and submodules: .git is a file pointing to the real git directory
+            try:
+                with open(git_dir, "r") as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if not content.startswith("gitdir:"):
+                return None
+            git_dir = (package_path / content[len("gitdir:"):].strip()).resolve()
+
+        if not (git_dir / "HEAD").exists():
+            return None
+
+        common_dir = git_dir
+        commondir_file = git_dir / "commondir"
+        if commondir_file.exists():
+            try:
+                with open(commondir_file, "r") as f:
+                    common_dir = (git_dir / f.read().strip()).resolve()
+            except OSError:
+                pass
+
+        if not (common_dir / "config").exists():
+            return None
+
+        return GitMetadata(package_path, git_dir, common_dir)
+
+    @property
+    def head(self) -> str | None:
+        """
+        The ref HEAD points to (e.g. refs/heads/main), or None if HEAD is detached.
+        """
+        try:
+            with open(self.git_dir / "HEAD", "r") as f:
+                content = f.read().strip()
+        except OSError:
+            return None
+        if content.startswith("ref:"):
+            return content[len("ref:"):].strip()
+        return None
+
+    @property
+    def current_branch(self) -> str | None:
+        head = self.head
+        if head is None or not head.startswith("refs/heads/"):
+            return None
+        return head.removeprefix("refs/heads/")
+
+    @property
+    def remotes(self) -> dict[str, GitRemote]:
+        remotes: dict[str, GitRemote] = {}
+        for name in self.config.subsections("remote"):
+            remotes[name] = GitRemote(
+                name=name,
+                urls=self.config.get_all(f"remote.{name}", "url"),
+                fetch=self.config.get_all(f"remote.{name}", "fetch")
+            )
+        return remotes
+
+    @property
+    def default_remote(self) -> str | None:
+        """
+        The remote git uses when nothing else is configured: origin, or the only remote there is.
+        """
+        remotes = self.remotes
+        if "origin" in remotes:
+            return "origin"
+        if len(remotes) == 1:
+            return next(iter(remotes))
+        return None
+
+    def upstream(self, branch: str | None = None) -> GitUpstream | None:
+        branch = branch or self.current_branch
+        if branch is None:
+            return None
+        remote = self.config.get(f"branch.{branch}", "remote")
+        merge = self.config.get(f"branch.{branch}", "merge")
+        if remote is None or merge is None:
+            return None
+        return GitUpstream(remote=remote, merge=merge)
+
+    def remote_problem(self) -> str | None:
+        """
+        Why pushing or pulling the current branch can't work, or None if a remote is available.
+        """
+        upstream = self.upstream()
+        if upstream is not None:
+            if upstream.remote != "." and upstream.remote not in self.remotes:
+                return f"Git remote {upstream.remote} not found."
+        elif self.default_remote is None:
+            return "Git remote not found."
+        return None
+
+    def resolve_ref(self, ref: str) -> str | None:
+        """
+        Object id of a full ref name such as refs/heads/main, following symbolic refs.
+        """
+        for _ in range(8):
+            base_dir = self.git_dir if ref == "HEAD" else self.common_dir
+            try:
+                with open(base_dir / ref, "r") as f:
+                    content = f.read().strip()
+            except OSError:
+                return self._read_packed_refs().get(ref)
+            if not content.startswith("ref:"):
+                return content
+            ref = content[len("ref:"):].strip()
+        return None
+
+    def _read_packed_refs(self) -> dict[str, str]:
+        if self._packed_refs is not None:
+            return self._packed_refs
+        refs: dict[str, str] = {}
+        try:
+            with open(self.common_dir / "packed-refs", "r") as f:
+                for line in f:
+                    if line.startswith("#") or line.startswith("^"):
+                        continue
+                    parts = line.strip().split(" ", 1)
+                    if len(parts) == 2:
+                        refs[parts[1]] = parts[0]
+        except OSError:
+            pass
+        self._packed_refs = refs
+        return refs
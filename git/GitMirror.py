@@ -0,0 +1,63 @@
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+
+import core
+from .GitRunner import GitRunner, GitSteps
+
+class GitMirror:
+    """
+    A bare mirror of a remote repository in a local directory, created with `git clone --mirror` and then kept up to date with fetches.
+    """
+    url: str
+    mirror_directory: Path
+
+    def __init__(self, url: str, mirror_directory: Path) -> None:
+        self.url = url
+        self.mirror_directory = mirror_directory
+
+    @property
+    def path(self) -> Path:
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", self.url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+        digest = hashlib.sha1(self.url.encode("utf-8")).hexdigest()[:12]
+        return self.mirror_directory / f"{name}-{digest}.git"
+
+    @property
+    def mirror_url(self) -> str:
+        return self.path.absolute().as_uri()
+
+    def sync(self) -> core.CommandResult:
+        self.mirror_directory.mkdir(parents=True, exist_ok=True)
+        return GitRunner.run(self.mirror_directory, self._sync_steps())
+
+    def _sync_steps(self) -> GitSteps[core.CommandResult]:
+        path = self.path
+        if (path / "HEAD").exists():
+            result = yield ["git", "--git-dir", str(path), "remote", "update", "--prune"]
+            if not result.returncode == 0:
+                return core.CommandResult.fail(self._first_line(result.stderr) or f"Fetch failed with return code {result.returncode}.")
+            return core.CommandResult.success()
+
+        # clone next to the mirror and move it into place, so an interrupted clone never looks like a mirror
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        result = yield ["git", "clone", "--mirror", "--quiet", self.url, str(tmp_path)]
+        if not result.returncode == 0:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return core.CommandResult.fail(self._first_line(result.stderr) or f"Clone failed with return code {result.returncode}.")
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not (path / "HEAD").exists():
+                return core.CommandResult.fail(str(e))
+        return core.CommandResult.success()
+
+    @staticmethod
+    def _first_line(output: str) -> str | None:
+        for line in output.split("\n"):
+            if line.strip() != "":
+                return line.strip()
+        return None
@@ -1,81 +1,182 @@
-import subprocess
 from pathlib import Path
 
 import core
+from .GitRunner import GitRunner, GitSteps
+from .GitMetadata import GitMetadata
 
 class GitPull:
+    """
+    Pull in two stages: a network-bound fetch, then a local stage that compares refs and fast-forwards or resets.
+    """
     def __init__(self, package_path: Path) -> None:
         self.package_path = package_path
 
     def can_pull(self) -> core.CommandResult | None:
-        config_path = self.package_path / ".git" / "config"
-        if not config_path.exists():
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
             return core.CommandResult.fail("Git config not found.")
 
-        with open(config_path, "r") as f:
-            config = f.read()
-            if "[remote \"origin\"]" not in config:
-                return core.CommandResult.fail("Git remote origin not found.")
-            
+        problem = metadata.remote_problem()
+        if problem is not None:
+            return core.CommandResult.fail(problem)
+
         return core.CommandResult.success()
-    
+
     def run(self, force: bool, auto_fix_upstream_origin: bool) -> core.CommandResult:
-        result = subprocess.run(["git", "pull"], cwd=self.package_path, capture_output=True, text=True)
+        return GitRunner.run(self.package_path, self._pull_steps(force, auto_fix_upstream_origin))
 
-        if "Already up to date." in result.stdout:
-            return core.CommandResult.ignorable()
-        
-        if "There is no tracking information " in result.stderr:
-            if auto_fix_upstream_origin:
-                result = self._fix_upstream_origin()
-                if result.type == "fail":
-                    return result
-                
-                return core.CommandResult.success("Fixed upstream origin.")
-                
-            return core.CommandResult.fail("Upstream origin not set.")
-        
-        if "Need to specify how to reconcile divergent branches." in result.stderr:
-            if force:
-                return self._force_pull()
-            else:
-                return core.CommandResult.fail("There is a conflict. Use --force to force pull.")
-        
-        if not result.returncode == 0:
-            return core.CommandResult.fail(f"Pull failed with return code {result.returncode}.")
-        
-        return core.CommandResult.success()
-    
+    async def run_async(self, engine: core.AsyncProcessEngine, force: bool, auto_fix_upstream_origin: bool) -> core.CommandResult:
+        return await GitRunner.run_async(self.package_path, self._pull_steps(force, auto_fix_upstream_origin), engine)
 
-    def _get_current_branch_name(self) -> str | None:
-        result = subprocess.run("git branch | grep -e '^\\* ' | sed -e 's/^\\* //g'", shell=True, cwd=self.package_path, capture_output=True, text=True)
-        if not result.returncode == 0:
-            return None
-        
-        return result.stdout.strip()
-    
-    def _fix_upstream_origin(self) -> core.CommandResult:
-        branch_name = self._get_current_branch_name()
+    def fetch(self) -> core.CommandResult:
+        return GitRunner.run(self.package_path, self._fetch_steps())
+
+    async def fetch_async(self, engine: core.AsyncProcessEngine) -> core.CommandResult:
+        return await GitRunner.run_async(self.package_path, self._fetch_steps(), engine)
+
+    def integrate(self, force: bool, auto_fix_upstream_origin: bool) -> core.CommandResult:
+        return GitRunner.run(self.package_path, self._integrate_steps(force, auto_fix_upstream_origin))
+
+    def needs_integration(self) -> core.CommandResult | None:
+        """
+        After fetching, decide in-process whether the local stage has any work to do.
+        Returns the final result if it hasn't, or None if integrate() has to run.
+        """
+        GitMetadata.invalidate(self.package_path)
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
+            return core.CommandResult.fail("Git config not found.")
+
+        branch_name = metadata.current_branch
         if branch_name is None:
             return core.CommandResult.fail("Failed to get current branch name.")
-        
-        result = subprocess.run(f"git branch --set-upstream-to=origin/{branch_name} {branch_name}", shell=True, cwd=self.package_path, capture_output=True, text=True)
+
+        upstream = metadata.upstream(branch_name)
+        if upstream is None:
+            return None
+
+        local_oid = metadata.resolve_ref(f"refs/heads/{branch_name}")
+        remote_oid = metadata.resolve_ref(upstream.tracking_ref)
+        if remote_oid is not None and local_oid == remote_oid:
+            return core.CommandResult.ignorable()
+        return None
+
+    def _pull_steps(self, force: bool, auto_fix_upstream_origin: bool) -> GitSteps[core.CommandResult]:
+        result = yield from self._fetch_steps()
+        if result.type == "fail":
+            return result
+
+        result = self.needs_integration()
+        if result is not None:
+            return result
+
+        return (yield from self._integrate_steps(force, auto_fix_upstream_origin))
+
+    def _fetch_steps(self) -> GitSteps[core.CommandResult]:
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
+            return core.CommandResult.fail("Git config not found.")
+
+        upstream = metadata.upstream()
+        remote = upstream.remote if upstream is not None else metadata.default_remote
+        if remote is None:
+            return core.CommandResult.fail("Git remote not found.")
+        if remote == ".":
+            return core.CommandResult.success()
+
+        result = yield ["git", "fetch", "--quiet", remote]
+        GitMetadata.invalidate(self.package_path)
         if not result.returncode == 0:
-            return core.CommandResult.fail("Failed to set upstream origin.")
-        
-        return core.CommandResult.ignorable()
+            return core.CommandResult.fail(self._first_line(result.stderr) or f"Fetch failed with return code {result.returncode}.")
+
+        return core.CommandResult.success()
+
+    def _integrate_steps(self, force: bool, auto_fix_upstream_origin: bool) -> GitSteps[core.CommandResult]:
+        GitMetadata.invalidate(self.package_path)
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
+            return core.CommandResult.fail("Git config not found.")
 
-    def _force_pull(self) -> core.CommandResult:
-        branch_name = self._get_current_branch_name()
+        branch_name = metadata.current_branch
         if branch_name is None:
             return core.CommandResult.fail("Failed to get current branch name.")
-        
-        result = subprocess.run(f"git fetch && git reset --hard origin/{branch_name}", shell=True, cwd=self.package_path, capture_output=True, text=True)
+
+        upstream = metadata.upstream(branch_name)
+        fixed_upstream = False
+        if upstream is None:
+            if not auto_fix_upstream_origin:
+                return core.CommandResult.fail("Upstream origin not set.")
+
+            fix_result = yield from self._fix_upstream_origin()
+            if fix_result.type == "fail":
+                return fix_result
+
+            metadata = GitMetadata.load(self.package_path)
+            upstream = metadata.upstream(branch_name) if metadata is not None else None
+            if metadata is None or upstream is None:
+                return core.CommandResult.fail("Failed to set upstream origin.")
+            fixed_upstream = True
+
+        local_oid = metadata.resolve_ref(f"refs/heads/{branch_name}")
+        remote_oid = metadata.resolve_ref(upstream.tracking_ref)
+        if remote_oid is None:
+            return core.CommandResult.fail(f"Remote branch {upstream.remote}/{upstream.branch} not found.")
+
+        if local_oid == remote_oid:
+            result = core.CommandResult.ignorable()
+        elif local_oid is None:
+            result = yield from self._reset_steps(upstream.tracking_ref, "Pulled.")
+        else:
+            result = yield from self._merge_steps(local_oid, remote_oid, upstream.tracking_ref, force)
+
+        if fixed_upstream and result.type != "fail":
+            return core.CommandResult.success("Fixed upstream origin.")
+        return result
+
+    def _merge_steps(self, local_oid: str, remote_oid: str, tracking_ref: str, force: bool) -> GitSteps[core.CommandResult]:
+        result = yield ["git", "merge-base", "--is-ancestor", local_oid, remote_oid]
+        if result.returncode == 0:
+            result = yield ["git", "merge", "--ff-only", "--quiet", tracking_ref]
+            if not result.returncode == 0:
+                return core.CommandResult.fail(self._first_line(result.stderr) or f"Pull failed with return code {result.returncode}.")
+            return core.CommandResult.success()
+        if not result.returncode == 1:
+            return core.CommandResult.fail("Failed to compare with upstream.")
+
+        result = yield ["git", "merge-base", "--is-ancestor", remote_oid, local_oid]
+        if result.returncode == 0:
+            # only local commits; nothing to pull
+            return core.CommandResult.ignorable()
+
+        if force:
+            return (yield from self._reset_steps(tracking_ref, "Force pulled."))
+        return core.CommandResult.fail("There is a conflict. Use --force to force pull.")
+
+    def _reset_steps(self, tracking_ref: str, message: str) -> GitSteps[core.CommandResult]:
+        result = yield ["git", "reset", "--hard", "--quiet", tracking_ref]
         if not result.returncode == 0:
             return core.CommandResult.fail("Failed to force pull.")
-        
-        return core.CommandResult.success("Force pulled.")
+        return core.CommandResult.success(message)
 
-    
+    def _fix_upstream_origin(self) -> GitSteps[core.CommandResult]:
+        metadata = GitMetadata.load(self.package_path)
+        branch_name = metadata.current_branch if metadata is not None else None
+        if metadata is None or branch_name is None:
+            return core.CommandResult.fail("Failed to get current branch name.")
+        remote = metadata.default_remote
+        if remote is None:
+            return core.CommandResult.fail("Git remote not found.")
 
+        result = yield ["git", "branch", f"--set-upstream-to={remote}/{branch_name}", branch_name]
+        GitMetadata.invalidate(self.package_path)
+        if not result.returncode == 0:
+            return core.CommandResult.fail("Failed to set upstream origin.")
+
+        return core.CommandResult.ignorable()
 
+    @staticmethod
+    def _first_line(output: str) -> str | None:
+        for line in output.split("\n"):
+            if line.strip() != "":
+                return line.strip()
+        return None
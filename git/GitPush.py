@@ -1,7 +1,43 @@
-import subprocess
 from pathlib import Path
+from dataclasses import dataclass
 
 import core 
+from .GitRunner import GitRunner, GitSteps
+from .GitMetadata import GitMetadata
+
+@dataclass
+class RefStatus:
+    """
+    One line of `git push --porcelain`: flag, source and destination ref, summary and optional reason.
+    """
+    flag: str
+    source: str
+    destination: str
+    summary: str
+    reason: str | None = None
+
+    @property
+    def rejected(self) -> bool:
+        return self.flag == "!"
+
+    @property
+    def up_to_date(self) -> bool:
+        return self.flag == "="
+
+    @staticmethod
+    def parse(stdout: str) -> list["RefStatus"]:
+        statuses: list[RefStatus] = []
+        for line in stdout.split("\n"):
+            fields = line.split("\t")
+            if len(fields) < 3 or len(fields[0]) != 1:
+                continue
+            source, _, destination = fields[1].partition(":")
+            summary = fields[2]
+            reason: str | None = None
+            if summary.endswith(")") and " (" in summary:
+                summary, _, reason = summary[:-1].partition(" (")
+            statuses.append(RefStatus(flag=fields[0], source=source, destination=destination, summary=summary, reason=reason))
+        return statuses
 
 class GitPush:
     def __init__(self, package_path: Path) -> None:
@@ -10,50 +46,102 @@ class GitPush:
         self.package_path = package_path
 
     def can_push(self) -> core.CommandResult | None:
-        config_path = self.package_path / ".git" / "config"
-        if not config_path.exists():
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
             return core.CommandResult.fail("Git config not found.")
 
-        with open(config_path, "r") as f:
-            config = f.read()
-            if "[remote \"origin\"]" not in config:
-                return core.CommandResult.fail("Git remote origin not found.")
+        problem = metadata.remote_problem()
+        if problem is not None:
+            return core.CommandResult.fail(problem)
+
+    def tags_fingerprint(self) -> list[int] | None:
+        """
+        Cheap fingerprint of the local tags. Creating or deleting a tag touches refs/tags or packed-refs.
+        """
+        metadata = GitMetadata.load(self.package_path)
+        if metadata is None:
+            return None
+        fingerprint: list[int] = []
+        for path in [metadata.common_dir / "refs" / "tags", metadata.common_dir / "packed-refs"]:
+            try:
+                fingerprint.append(path.stat().st_mtime_ns)
+            except OSError:
+                fingerprint.append(0)
+        return fingerprint
+
+    def push_refs(self, force: bool, branch: bool = True, tags: bool = True) -> tuple[core.CommandResult, core.CommandResult]:
+        """
+        Push the current branch and the tags in one `git push`. Returns the results for the branch and for the tags.
+        """
+        return GitRunner.run(self.package_path, self._push_refs_steps(force, branch, tags))
 
-    def push(self, force: bool) -> core.CommandResult:
+    async def push_refs_async(self, engine: core.AsyncProcessEngine, force: bool, branch: bool = True, tags: bool = True) -> tuple[core.CommandResult, core.CommandResult]:
+        return await GitRunner.run_async(self.package_path, self._push_refs_steps(force, branch, tags), engine)
+
+    def _push_refs_steps(self, force: bool, branch: bool, tags: bool) -> GitSteps[tuple[core.CommandResult, core.CommandResult]]:
         can_push = self.can_push()
         if can_push is not None:
-            return can_push
-        
-        command = ["git", "push"]
-        if force:
-            command.append("--force")
+            return can_push, can_push
 
-        result = subprocess.run(command, cwd=self.package_path, capture_output=True, text=True)
-        if "Everything up-to-date" in result.stdout:
-            return core.CommandResult.ignorable()
+        metadata = GitMetadata.load(self.package_path)
+        assert metadata is not None
+        branch_name = metadata.current_branch
+        if branch and branch_name is None:
+            branch_result = core.CommandResult.fail("Failed to get current branch name.")
+            if not tags:
+                return branch_result, core.CommandResult.ignorable()
+            tags_result = yield from self._push_tags_steps()
+            return branch_result, tags_result
 
-        if not result.returncode == 0:
-            lines = result.stderr.split("\n")
-            if len(lines) > 0:
-                reason = lines[0]
-                return core.CommandResult.fail(reason)
-            else:
-                return core.CommandResult.fail(f"Push failed with return code {result.returncode}")
+        upstream = metadata.upstream(branch_name)
+        remote = upstream.remote if upstream is not None else metadata.default_remote
+        assert remote is not None
+
+        refspecs: list[str] = []
+        if branch and branch_name is not None:
+            destination = upstream.merge if upstream is not None else f"refs/heads/{branch_name}"
+            refspecs.append(f"{'+' if force else ''}refs/heads/{branch_name}:{destination}")
+        if tags:
+            refspecs.append("--tags")
+        if len(refspecs) == 0:
+            return core.CommandResult.ignorable(), core.CommandResult.ignorable()
+
+        command = ["git", "push", "--porcelain", "--atomic", remote, *refspecs]
+        result = yield command
+        if result.returncode != 0 and "does not support --atomic" in result.stderr:
+            result = yield [arg for arg in command if arg != "--atomic"]
 
+        statuses = RefStatus.parse(result.stdout)
+        if len(statuses) == 0 and result.returncode != 0:
+            lines = [line for line in result.stderr.split("\n") if line.strip() != ""]
+            failure = core.CommandResult.fail(lines[0] if len(lines) > 0 else f"Push failed with return code {result.returncode}")
+            return (failure if branch else core.CommandResult.ignorable()), (failure if tags else core.CommandResult.ignorable())
+
+        branch_statuses = [status for status in statuses if status.destination.startswith("refs/heads/")]
+        tag_statuses = [status for status in statuses if status.destination.startswith("refs/tags/")]
+        branch_result = self._summarize(branch_statuses) if branch else core.CommandResult.ignorable()
+        tags_result = self._summarize(tag_statuses) if tags else core.CommandResult.ignorable()
+        return branch_result, tags_result
+
+    def _summarize(self, statuses: list[RefStatus]) -> core.CommandResult:
+        rejected = [status for status in statuses if status.rejected]
+        if len(rejected) > 0:
+            status = rejected[0]
+            name = status.source.removeprefix("refs/heads/").removeprefix("refs/tags/")
+            return core.CommandResult.fail(f"{name}: {status.reason or status.summary}")
+        if all(status.up_to_date for status in statuses):
+            return core.CommandResult.ignorable()
         return core.CommandResult.success()
 
-    def push_tags(self) -> core.CommandResult:
+    def _push_tags_steps(self) -> GitSteps[core.CommandResult]:
         can_push = self.can_push()
         if can_push is not None:
             return can_push
 
-        result = subprocess.run(["git", "push", "--tags"], cwd=self.package_path, capture_output=True, text=True)
+        result = yield ["git", "push", "--tags"]
         if "Everything up-to-date" in result.stderr:
             return core.CommandResult.ignorable()
 
-        # print("stdout", result.stdout)
-        # print("stderr", result.stderr)
-
         reject_message = [line for line in result.stderr.split("\n") if "[rejected]" in line]
         if len(reject_message):
             return core.CommandResult.fail(reject_message[0].replace("! [rejected]", "").strip())
@@ -66,4 +154,4 @@ class GitPush:
             else:
                 return core.CommandResult.fail(f"Push tags failed with return code {result.returncode}")
 
-        return core.CommandResult.success()
\ No newline at end of file
+        return core.CommandResult.success()
@@ -0,0 +1,33 @@
+import subprocess
+from pathlib import Path
+from typing import Generator, TypeVar
+
+import core
+
+Result = TypeVar("Result")
+
+# A git operation written as a generator: it yields each command to run, receives
+# the completed process back, and finally returns its result. The same steps can
+# then be driven by blocking subprocess calls or by an AsyncProcessEngine.
+GitSteps = Generator[list[str], "subprocess.CompletedProcess[str]", Result]
+
+class GitRunner:
+    @staticmethod
+    def run(package_path: Path, steps: GitSteps[Result]) -> Result:
+        try:
+            command = next(steps)
+            while True:
+                result = subprocess.run(command, cwd=package_path, capture_output=True, text=True)
+                command = steps.send(result)
+        except StopIteration as e:
+            return e.value
+
+    @staticmethod
+    async def run_async(package_path: Path, steps: GitSteps[Result], engine: core.AsyncProcessEngine) -> Result:
+        try:
+            command = next(steps)
+            while True:
+                result = await engine.run(command, cwd=package_path)
+                command = steps.send(result)
+        except StopIteration as e:
+            return e.value
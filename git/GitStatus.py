@@ -0,0 +1,66 @@
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import core
+
+@dataclass
+class StatusSummary:
+    dirty: bool
+    ahead: int = 0
+    behind: int = 0
+    has_upstream: bool = True
+
+    @property
+    def needs_push(self) -> bool:
+        """
+        Whether the branch may have commits the remote doesn't. Without an upstream git can't tell, so it is pushed.
+        """
+        return self.ahead > 0 or not self.has_upstream
+
+class GitStatus:
+    _supports_builtin_fsmonitor: bool | None = None
+
+    def __init__(self, package_path: Path) -> None:
+        self.package_path = package_path
+
+    def summary(self) -> StatusSummary | core.CommandResult:
+        result = subprocess.run(self._status_command(), cwd=self.package_path, capture_output=True, text=True)
+        if not result.returncode == 0:
+            lines = result.stderr.strip().split("\n")
+            return core.CommandResult.fail(lines[0] if lines[0] else f"Status failed with return code {result.returncode}.")
+
+        summary = StatusSummary(dirty=False, has_upstream=False)
+        for line in result.stdout.split("\n"):
+            if line.startswith("# branch.upstream "):
+                summary.has_upstream = True
+            elif line.startswith("# branch.ab "):
+                match = re.match(r"# branch\.ab \+(\d+) -(\d+)", line)
+                if match:
+                    summary.ahead = int(match.group(1))
+                    summary.behind = int(match.group(2))
+            elif line[:2] in ("1 ", "2 ", "u ", "? "):
+                summary.dirty = True
+
+        return summary
+
+    def _status_command(self) -> list[str]:
+        command = ["git", "-c", "core.untrackedCache=true"]
+        if self._fsmonitor_available():
+            command += ["-c", "core.fsmonitor=true"]
+        return command + ["status", "--porcelain=v2", "--branch", "--untracked-files=normal"]
+
+    @classmethod
+    def _fsmonitor_available(cls) -> bool:
+        # The builtin fsmonitor daemon exists on macOS and Windows since git 2.36.
+        # Older versions would read "true" as the path of a hook, so the version has to be checked.
+        if cls._supports_builtin_fsmonitor is None:
+            cls._supports_builtin_fsmonitor = False
+            if sys.platform in ("darwin", "win32"):
+                result = subprocess.run(["git", "--version"], capture_output=True, text=True)
+                match = re.search(r"(\d+)\.(\d+)", result.stdout)
+                if match:
+                    cls._supports_builtin_fsmonitor = (int(match.group(1)), int(match.group(2))) >= (2, 36)
+        return cls._supports_builtin_fsmonitor
@@ -1,3 +1,7 @@
+from .GitMetadata import GitMetadata, GitConfig, GitRemote, GitUpstream
+from .GitRunner import GitRunner, GitSteps
 from .GitCommit import GitCommit
-from .GitPush import GitPush
-from .GitPull import GitPull
\ No newline at end of file
+from .GitPush import GitPush, RefStatus
+from .GitPull import GitPull
+from .GitStatus import GitStatus, StatusSummary
+from .GitMirror import GitMirror
@@ -1,31 +1,55 @@
 from argparse import ArgumentParser
+from pathlib import Path
+import sys
 
-import core
-import git
-import front
-
+import spm_client
 from default_root_path import default_root_path
 
 if __name__ == "__main__":
+    # a running `spm server` answers before the commands are even imported
+    returncode = spm_client.try_run(sys.argv[1:], default_root_path)
+    if returncode is not None:
+        exit(returncode)
+
+    import core
+    import git
+    import front
+
     logger = core.Logger(is_debug=False, command_name="spm")
+    file_manager = core.FileManager(command_name="spm", root=Path.home(), logger=logger)
 
     parser = ArgumentParser(description="SPM package utilities")
     subparsers = parser.add_subparsers()
     
     commit_parser = subparsers.add_parser("push", help="Commit/Push all packages")
-    commit_parser.set_defaults(func=front.SPMPush(default_root_path=default_root_path, logger=logger, parser=commit_parser).run)
+    commit_parser.set_defaults(func=front.SPMPush(default_root_path=default_root_path, logger=logger, parser=commit_parser, file_manager=file_manager).run)
 
     pull_parser = subparsers.add_parser("pull", help="Pull all packages")
-    pull_parser.set_defaults(func=front.SPMPull(default_root_path=default_root_path, logger=logger, parser=pull_parser).run)
+    pull_parser.set_defaults(func=front.SPMPull(default_root_path=default_root_path, logger=logger, parser=pull_parser, file_manager=file_manager).run)
 
     test_parser = subparsers.add_parser("test", help="Test all packages")
-    test_parser.set_defaults(func=front.SPMTest(default_root_path=default_root_path, logger=logger, parser=test_parser).run)
+    test_parser.set_defaults(func=front.SPMTest(default_root_path=default_root_path, logger=logger, parser=test_parser, file_manager=file_manager).run)
 
     clean_parser = subparsers.add_parser("clean", help="Clean all packages")
-    clean_parser.set_defaults(func=front.SPMClean(default_root_path=default_root_path, logger=logger, parser=clean_parser).run)
+    clean_parser.set_defaults(func=front.SPMClean(default_root_path=default_root_path, logger=logger, parser=clean_parser, file_manager=file_manager).run)
 
     update_parser = subparsers.add_parser("update", help="Update all packages")
-    update_parser.set_defaults(func=front.SPMUpdate(default_root_path=default_root_path, logger=logger, parser=update_parser).run)
+    update_parser.set_defaults(func=front.SPMUpdate(default_root_path=default_root_path, logger=logger, parser=update_parser, file_manager=file_manager).run)
+
+    fingerprint_parser = subparsers.add_parser("fingerprint", help="Print the content fingerprint of all packages")
+    fingerprint_parser.set_defaults(func=front.SPMFingerprint(default_root_path=default_root_path, logger=logger, parser=fingerprint_parser, file_manager=file_manager).run)
+
+    describe_parser = subparsers.add_parser("describe", help="Print the products and dependencies of all packages")
+    describe_parser.set_defaults(func=front.SPMDescribe(default_root_path=default_root_path, logger=logger, parser=describe_parser, file_manager=file_manager).run)
+
+    du_parser = subparsers.add_parser("du", help="Print the disk usage of the build artifacts of all packages")
+    du_parser.set_defaults(func=front.SPMDiskUsage(default_root_path=default_root_path, logger=logger, parser=du_parser, file_manager=file_manager).run)
+
+    status_parser = subparsers.add_parser("status", help="Print the git status of all packages")
+    status_parser.set_defaults(func=front.SPMStatus(default_root_path=default_root_path, logger=logger, parser=status_parser, file_manager=file_manager).run)
+
+    server_parser = subparsers.add_parser("server", help="Keep the caches warm and answer status and cached test from memory")
+    server_parser.set_defaults(func=front.SPMServer(default_root_path=default_root_path, logger=logger, parser=server_parser, file_manager=file_manager).run)
 
     args = parser.parse_args()
     if hasattr(args, "func"):
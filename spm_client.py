@@ -0,0 +1,71 @@
+"""
+Thin client of `spm server`. It only uses the standard library, so that a command the server answers
+doesn't pay for importing core, git and front.
+"""
+from pathlib import Path
+import json
+import os
+import socket
+
+protocol_version = 1
+# the command directory of core.FileManager(command_name="spm", root=Path.home())
+default_command_directory = Path.home() / ".spm"
+
+def socket_path(command_directory: Path) -> Path:
+    return command_directory / "server.sock"
+
+def request(command_directory: Path, message: dict, timeout: float = 10.0) -> dict | None:
+    """
+    Send one request to the server and return its response, or None if no server is running or it can't answer.
+    """
+    path = socket_path(command_directory)
+    if not path.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(timeout)
+            connection.connect(str(path))
+            connection.sendall((json.dumps({"version": protocol_version, **message}) + "\n").encode("utf-8"))
+            with connection.makefile("rb") as stream:
+                line = stream.readline()
+        response = json.loads(line)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(response, dict) or response.get("fallback", False):
+        return None
+    return response
+
+def try_run(argv: list[str], default_root_path: Path, command_directory: Path = default_command_directory) -> int | None:
+    """
+    Answer `spm status` and a fully cached `spm test` from a running server.
+    Returns the exit code, or None if the command has to run in this process.
+    """
+    message = _parse(argv, default_root_path)
+    if message is None:
+        return None
+    response = request(command_directory, message)
+    if response is None:
+        return None
+    for line in response.get("lines", []):
+        print(line)
+    return int(response.get("returncode", 0))
+
+def _parse(argv: list[str], default_root_path: Path) -> dict | None:
+    # only the plain forms are answered; any other option runs the command in this process
+    if len(argv) == 0 or argv[0] not in ("status", "test"):
+        return None
+    root: str | None = None
+    name: str | None = None
+    arguments = argv[1:]
+    while len(arguments) > 0:
+        argument = arguments.pop(0)
+        if argv[0] == "test" and argument in ("-n", "--name") and len(arguments) > 0:
+            name = arguments.pop(0)
+        elif argv[0] == "test" and argument.startswith("--name="):
+            name = argument.removeprefix("--name=")
+        elif not argument.startswith("-") and root is None:
+            root = argument
+        else:
+            return None
+    root_path = default_root_path if root is None else Path(root)
+    return {"command": argv[0], "root": os.path.abspath(root_path), "name": name}